@@ -39,7 +39,8 @@ async def clear_short_term_memory():
 
 
 async def update_context():
-    assistant.context.update()
+    if not assistant.context.update():
+        return "Context unchanged."
     return assistant.context
 
 
@@ -68,6 +69,11 @@ async def generate_reaper_project(today=datetime.now(), days=1):
     return filepath
 
 
+async def stop_speaking():
+    """Stop the answer in progress, its playback and queued speech."""
+    await assistant.interrupt()
+
+
 async def exit_program():
     assistant.stop()
     # await database.close()
@@ -90,5 +96,6 @@ assistant.commands = {
     "generate reaper project": generate_reaper_project,
     "update context": update_context,
     "update voice": update_voice,
+    "stop speaking": stop_speaking,
     "exit program": exit_program,
 }
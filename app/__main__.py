@@ -6,6 +6,7 @@ import os
 
 from app.system.config import Config
 from app.speech import VoiceStyle
+from app.audio import FileSource
 from app.chat import Context
 
 from app import channel, storage, broadcast, assistant
@@ -19,6 +20,8 @@ class Arguments(Protocol):
     config: str
     context: str
     voice: str
+    replay: str | None
+    fast: bool
 
 
 def main(argv: Arguments):
@@ -33,7 +36,12 @@ def main(argv: Arguments):
         voice = VoiceStyle.from_xml(argv.voice)
         config = Config.from_toml(argv.config)
         broadcast.load(context)
-        channel.load(config.audio)
+        source = (
+            FileSource(argv.replay, config.audio.channel, realtime=not argv.fast)
+            if argv.replay
+            else None
+        )
+        channel.load(config.audio, source=source)
         storage.load(config.storage)
         assistant.load(config, voice, context)
         # Execute startup command.
@@ -70,5 +78,16 @@ if __name__ == "__main__":
         default="cvoice.xml",
         help="Location of voice style file.",
     )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        default=None,
+        help="Audio file or directory to use as input instead of the microphone.",
+    )
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Replay input as fast as possible instead of real time.",
+    )
     main(parser.parse_args())
     print("Bye!")
@@ -1,10 +1,20 @@
+from concurrent.futures import Future
+from dataclasses import replace
+from threading import Thread
+from io import BytesIO
+import asyncio
+
 from app.assistant.commands import Commands
 from app.speech import Speech, VoiceStyle
 from app.chat import Chat, Context
+from app.chat.streamer import prefetch
+from app.chat.message import Message, ROLES
 from app.system.config import Config
+from app.system.logger import log_json
 from app.broadcast import Broadcast
 
-from app.audio import AudioChannel, Transcribe
+from app.audio import AudioChannel, Transcribe, Capture
+from app.types import AudioProcess
 from app.storage import Storage
 
 
@@ -34,7 +44,7 @@ class Assistant:
         self.config = config.assistant
         SR = config.audio.channel.samplerate
         # models
-        self.speech = Speech(voice, SR)
+        self.speech = Speech(voice, SR, config=config.models.speech)
         self.chat = Chat(config.models.chat, context)
         self.transcribe = Transcribe(config.models.transcribe, SR)
         # flow
@@ -42,6 +52,8 @@ class Assistant:
         self.awake = False
         self.attend_spls = self.config.wakeup.awake_seconds * SR
         self.notes = ""
+        self.interaction: asyncio.Task = None
+        self.recording: asyncio.Task = None
         # triggers
         self.wakeup_words = self.config.wakeup.triggers
         self.sleep_words = self.config.sleep.triggers
@@ -60,58 +72,194 @@ class Assistant:
             - If the prompt contains an attend word or assistant is awake, enter chat.
             - Prompt chat including assistant's notes.
             - Synthesize speech from chat response.
-            - Play audio file and store interaction in database.
+            - Queue audio for playback and store interaction in database.
+            - The interaction runs on its own task while the next captures are read.
+              A new prompt to chat, a sleep word or the stop command interrupts it: the
+              completion, pending synthesis and playback are cancelled, nothing is stored.
+              Sources that aren't realtime wait for each interaction instead.
+            - Captures recorded during playback may be the assistant's own voice, only a
+              wakeup word starts a new chat from them, commands and sleep words are ignored.
         """
         # Add audio recorder to storage.
         self.storage.recorder = self.channel.recorder
         # Initialize audio process.
-        audio_process = self.channel.start(self.broadcast, self.attend_spls)
+        audio_process = self.channel.start(
+            self.broadcast, self.attend_spls, self.transcribe.features(self.broadcast)
+        )
         # Expects sample position and audio capture.
-        for spls, capture in audio_process:
+        while (item := await self.read(audio_process)) is not None:
+            spls, capture = item
+            # The microphone may have picked up the assistant's own voice.
+            echo = self.channel.source.realtime and self.channel.player.played_between(
+                capture.started_at, capture.ended_at
+            )
             # Transcribe capture.
+            attending = self.awake and self.attend_spls > spls
             for _ in self.broadcast.loading(":pencil:"):
-                self.prompt = self.transcribe.predict(capture.data)
+                self.prompt = await self.transcribe_capture(capture, attending)
             self.broadcast.clear()
             # Nothing was transcribed.
             if not self.prompt:
                 ...
+            # Don't let the assistant interrupt itself with its own words, unless it was called.
+            elif echo and not self.wakeup:
+                self.broadcast.capture(capture, self.prompt)
             # Execute command if found in prompt.
             elif (result := await self.commands.execute(self.prompt)) is not None:
                 self.broadcast.command(self.prompt, result)
             # Go to sleep if found in prompt. Set sample position to max.
             elif self.sleep:
+                await self.interrupt()
                 self.broadcast.sleep(self.prompt)
                 spls = self.attend_spls
             # Initialize interaction if assistant is awake or if prompt wakes it up.
             elif (self.awake and self.attend_spls > spls) or self.wakeup:
-                user_message = self.chat.user_message(f"{self.prompt}{self.notes}")
-                # Get similar messages from database and pass them to the chat.
-                self.chat.long_term = await self.storage.read_similar(
-                    user_message, exclude=self.chat.short_term
-                )
-                self.broadcast.user(f"{self.prompt} ({user_message.n_tokens})")
-                # Stream response blocks, broadcast and play audio.
-                for block in self.broadcast.assistant(self.chat.start(user_message)):
-                    file = self.speech.synthesize(block)
-                    self.channel.recorder.to_tape(file)
-                    self.channel.player.queue(file)
-                # Store interaction if chat was successful.
-                if self.chat.status_ok:
-                    # Store audio files if enabled and insert db records.
-                    self.storage.store_audiofiles(self.chat.short_term, capture)
-                    await self.storage.store_interaction(self.chat.short_term)
-                    # Restart audio sample position and assistant's notes.
-                    spls, self.notes = 0, ""
+                # Interrupt the previous answer, if still going.
+                await self.interrupt()
+                # The capture's samples are reused by the next captures, keep a copy to store.
+                capture = replace(capture, data=capture.data.clone())
+                self.interaction = asyncio.create_task(self.interact(capture, self.prompt))
+                # Restart audio sample position, attention counts from the prompt.
+                spls = 0
+                if not self.channel.source.realtime:
+                    await asyncio.wait([self.interaction])
             else:
                 # Broadcast capture and send sample position back to audio process.
                 self.broadcast.capture(capture, self.prompt)
             if self.exit:
                 raise KeyboardInterrupt
             audio_process.send(spls)
+        # Finite sources let the last answer finish.
+        if self.interaction is not None:
+            await asyncio.wait([self.interaction])
+
+    def read(self, audio_process: AudioProcess) -> asyncio.Future:
+        """Next sample position and capture, None once the process ends. Read on a daemon
+        thread so the running interaction goes on and an interrupt doesn't wait for it."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_result(item):
+            if not future.done():
+                future.set_result(item)
+
+        def set_exception(e: BaseException):
+            if not future.done():
+                future.set_exception(e)
+
+        def read():
+            try:
+                item = next(audio_process, None)
+            except BaseException as e:
+                loop.call_soon_threadsafe(set_exception, e)
+            else:
+                loop.call_soon_threadsafe(set_result, item)
+
+        Thread(target=read, daemon=True).start()
+        return future
+
+    async def interact(self, capture: Capture, prompt: str):
+        """Chat with the prompt, play the answer as it is synthesized and store the interaction.
+        Cancelling it closes the completion and synthesis, the partial answer isn't stored."""
+        content = f"{prompt}{self.notes}"
+        # Get similar messages from database and pass them to the chat. The lookup only
+        # needs the message id and content, so it runs while tokens are counted and
+        # is bounded by the retrieval budget.
+        similar = asyncio.ensure_future(
+            self.storage.read_similar_within(
+                Message.new(ROLES.USER, content, self.context.user.name),
+                exclude=self.chat.short_term,
+                budget_sec=self.chat.config.retrieval_budget_sec,
+            )
+        )
+        user_message = await asyncio.to_thread(self.chat.user_message, content)
+        self.broadcast.user(f"{prompt} ({user_message.n_tokens})")
+        self.chat.long_term, embedding = await similar
+        # Stream response blocks, broadcast and play audio. The completion keeps
+        # streaming on its own task while the next blocks are synthesized.
+        stream = self.broadcast.aassistant(prefetch(self.chat.astart(user_message)))
+        started, tape = None, asyncio.Queue()
+        self.recording = recording = asyncio.ensure_future(self.record(tape))
+        try:
+            async for audio in self.speech.asynthesize(stream):
+                # Playback starts on the first chunks, the tape reads the whole audio
+                # on its own task.
+                if started is None:
+                    started = Future()
+                    asyncio.ensure_future(self.log_latency(started))
+                    self.channel.player.queue(audio, started)
+                else:
+                    self.channel.player.queue(audio)
+                tape.put_nowait(audio)
+        finally:
+            tape.put_nowait(None)
+        # Tape is complete once the last block was read.
+        await recording
+        log_json({"speech_cache": self.speech.cache.stats if self.speech.cache else None})
+        # Store interaction if chat was successful, an interrupt doesn't stop it.
+        if self.chat.status_ok:
+            self.notes = ""
+            await asyncio.shield(self.store(capture, embedding))
+
+    async def store(self, capture: Capture, embedding: tuple[str, list[float]] | None):
+        """Store audio files if enabled and insert db records."""
+        self.storage.store_audiofiles(self.chat.short_term, capture)
+        await self.storage.store_interaction(self.chat.short_term, embedding)
+
+    async def interrupt(self):
+        """Stop playback and cancel the interaction in progress, its tape is dropped."""
+        self.channel.player.cancel()
+        if (task := self.interaction) is None or task.done():
+            return
+        task.cancel()
+        await asyncio.wait([task])
+        # The tape ends with the streams the player closed.
+        if self.recording is not None:
+            await asyncio.wait([self.recording])
+        self.channel.recorder.clear_tape()
+
+    async def transcribe_capture(self, capture: Capture, attending: bool) -> str:
+        """Transcribe capture with the full model. If screening is enabled and the assistant is
+        not attending, the screen model goes first and only triggers are transcribed again."""
+        if attending or not self.transcribe.screening:
+            return await self.transcribe.apredict(capture.data, capture.features)
+        prompt = await self.transcribe.apredict(capture.data, capture.features, tier="screen")
+        if not self.triggered(prompt):
+            return prompt
+        return await self.transcribe.apredict(capture.data, capture.features)
+
+    async def record(self, tape: asyncio.Queue):
+        """Add the synthesized audio to the recorder tape in order, until None is queued.
+        Each stream is read as a second reader, next to the player."""
+        while (audio := await tape.get()) is not None:
+            await asyncio.to_thread(lambda: self.channel.recorder.to_tape(BytesIO(audio.read())))
+
+    async def log_latency(self, started: Future):
+        """Log time to first block and time to first audio, once the player writes it.
+        Audio that was interrupted before it started has no time to first audio."""
+        started_at, first_block_sec = self.chat.started_at, self.chat.first_block_sec
+        try:
+            first_audio_sec = await asyncio.wrap_future(started) - started_at
+        except asyncio.CancelledError:
+            first_audio_sec = None
+        log_json(
+            {"latency": {"first_block_sec": first_block_sec, "first_audio_sec": first_audio_sec}}
+        )
+
+    def triggered(self, prompt: str) -> bool:
+        """Check if any wakeup word or command is in the screened prompt."""
+        prompt = prompt.lower()
+        if any(word in prompt for word in self.wakeup_words):
+            return True
+        prompt = prompt.translate(self.commands.no_punctuation)
+        return any(key in prompt for key in self.commands.data)
 
     def stop(self):
         """Stop the assistant."""
         self.exit = True
+        self.transcribe.close()
+        self.speech.close()
+        self.channel.player.close()
 
     @property
     def wakeup(self):
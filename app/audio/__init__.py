@@ -1,4 +1,5 @@
 from app.audio.channel import AudioChannel, AudioProcess
+from app.audio.source import AudioSource, FileSource, SignalSource
 from app.audio.transcribe import Transcribe
 from app.audio.recorder import Recorder
 from app.audio.capture import Capture
@@ -0,0 +1,65 @@
+from torch import Tensor, float32, dtype, zeros
+
+
+class CaptureBuffer:
+    """Preallocated sample buffer for gate captures.
+
+    Samples are written in place instead of concatenated, capacity grows by doubling
+    up to max_size. Two backing buffers are rotated on reset so the view handed out
+    with the previous capture stays valid while the next one is being written.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_size: int,
+        dtype: dtype = float32,
+        n_buffers: int = 2,
+    ) -> None:
+        """Allocate buffers of initial size, capped at max_size samples."""
+        self.dtype = dtype
+        self.max_size = max_size
+        self.buffers = [zeros(min(size, max_size), dtype=dtype) for _ in range(n_buffers)]
+        self.index = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def data(self) -> Tensor:
+        """Current backing buffer."""
+        return self.buffers[self.index]
+
+    @property
+    def capacity(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.max_size
+
+    def reset(self):
+        """Move to the next backing buffer and start writing from zero."""
+        self.index = (self.index + 1) % len(self.buffers)
+        self.size = 0
+
+    def write(self, x: Tensor) -> int:
+        """Copy x at the current position. Returns number of samples written."""
+        n = min(x.shape[0], self.max_size - self.size)
+        end = self.size + n
+        if end > self.capacity:
+            self.grow(end)
+        self.data[self.size : end] = x[:n]
+        self.size = end
+        return n
+
+    def grow(self, size: int):
+        """Double capacity (at least to size, at most max_size) keeping written samples."""
+        data = zeros(min(max(size, 2 * self.capacity), self.max_size), dtype=self.dtype)
+        data[: self.size] = self.data[: self.size]
+        self.buffers[self.index] = data
+
+    def view(self, size: int = None) -> Tensor:
+        """Zero-copy view of the first size samples written (all if None)."""
+        return self.data[: self.size if size is None else min(size, self.size)]
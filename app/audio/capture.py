@@ -1,16 +1,21 @@
-from typing import NamedTuple
-from torch import Tensor
+from dataclasses import dataclass
+from functools import cached_property
+from torch import Tensor, iinfo
 
 
-class Capture(NamedTuple):
+@dataclass(frozen=True, eq=False)
+class Capture:
     """Carries torch Tensor and its metadata.
 
     Attributes:
-        data (torch.Tensor): Audio data as Tensor.
+        data (torch.Tensor): Raw integer audio samples as Tensor.
         size (int): Sample size.
         sr (int): Sample rate.
         dbpeak (float): Peak in decibels.
         dbrms (float): RMS in decibels.
+        features (torch.Tensor, optional): Log-mel features built while recording.
+        started_at (float, optional): perf_counter time of the first sample.
+        ended_at (float, optional): perf_counter time of the last sample.
     """
 
     data: Tensor
@@ -18,8 +23,23 @@ class Capture(NamedTuple):
     sr: int
     dbpeak: float
     dbrms: float
+    features: Tensor | None = None
+    started_at: float | None = None
+    ended_at: float | None = None
+
+    @cached_property
+    def normalized(self) -> Tensor:
+        """Samples as float in [-1, 1), converted on first access."""
+        return normalize(self.data)
 
     def __repr__(self):
         return (
             f"Capture({self.dbpeak:.1f} db, {self.dbrms:.1f} rms, {(self.size / self.sr):.1f} s)"
         )
+
+
+def normalize(X: Tensor) -> Tensor:
+    """Integer samples to float in [-1, 1), float samples are returned as is."""
+    if X.is_floating_point():
+        return X
+    return X / (iinfo(X.dtype).max + 1)
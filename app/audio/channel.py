@@ -1,7 +1,5 @@
 from torch import (
     Tensor,
-    frombuffer,
-    cat,
     sqrt,
     mean,
     square,
@@ -11,8 +9,14 @@ from torch import (
 from pyaudio import PyAudio
 
 from app.types import AudioProcess, Broadcast
+from app.audio.features import FeatureBuilder
+from app.audio.buffer import CaptureBuffer
+from app.audio.source import AudioSource
+from app.audio.stream import InputStream
 from app.audio.recorder import Recorder
 from app.audio.capture import Capture
+from app.audio.noise import NoiseFloor
+from app.audio.vad import VAD
 from app.audio.player import Player
 from app.system.config import AudioConfig
 
@@ -23,90 +27,182 @@ class AudioChannel:
     def __init__(self) -> None:
         pass
 
-    def load(self, config: AudioConfig, channels: int = 1) -> None:
+    def load(self, config: AudioConfig, channels: int = 1, source: AudioSource = None) -> None:
+        """Load config and input source, defaults to the microphone through PyAudio."""
         # config
         self.config = config
         self.n_channels = channels
-        # pyaudio
+        # input
         self.frmt = self.config.channel.splformat
-        self.audio = PyAudio()
+        self.audio = PyAudio() if source is None else None
+        if source is None:
+            source = InputStream(
+                self.audio,
+                self.config.channel.samplerate,
+                self.n_channels,
+                self.frmt,
+                self.config.channel.chunk,
+                max_chunks=self.config.channel.max_queue_chunks,
+                dtype=self.config.channel.dtype,
+            )
+        self.source = source
         # system
         self.recorder = Recorder(self.config)
-        self.player = Player()
+        self.player = Player(self.config, self.audio)
 
-    def start(self, broadcast: Broadcast, spls_max: int) -> AudioProcess:
+    def start(
+        self, broadcast: Broadcast, spls_max: int, features: FeatureBuilder = None
+    ) -> AudioProcess:
         """Start live audio buffer stream with peak + rms gate.
         Peak values are measured on every buffer frame, while RMS only after
         the gate is closed (RMS of the whole capture).
+        In vad mode the gate opens and holds on voiced frames instead of peaks, and
+        captures with less than min_voiced_sec of voiced frames are rejected before ASR.
+        With an adaptive floor, peak, rms and vad energy thresholds follow the background
+        level estimated from every chunk, keeping the configured margins above it.
+        The input stream keeps recording into its queue while the capture is being
+        processed, the gate catches up with the queued chunks once resumed.
+        If a feature builder is given, it is fed while the gate is open so the capture
+        comes with its log-mel features. It is told if the capture starts within spls_max,
+        when the assistant attends to it.
 
         Args:
             broadcast (Broadcast): For broadcasting audio monitoring values.
             attend_spls (int): Limit sample position to count from when broadcasting.
+            features (FeatureBuilder, optional): Builds ASR features during capture.
 
         Yields:
             AudioProcess: Yields a sample position and an audio capture and
             expects to receive a new sample position.
-            The capture holds a Tensor and audio metadata.
+            The capture holds the raw integer samples and audio metadata. The Tensor is a
+            view of the capture buffer, valid until the capture after the next one is yielded.
         """
         # Load constants from config.
-        FS, DTYPE = self.config.channel.fullscale, self.config.channel.dtype
+        FS = self.config.channel.fullscale
         PEAK, RMS = self.config.gate.dbpeak, self.config.gate.dbrms
         CHUNK, SR = self.config.channel.chunk, self.config.channel.samplerate
         REFRESH = int(SR / self.config.channel.refreshrate_hz)
         HOLD = int(self.config.gate.hold_sec * SR)
         TAIL = int(self.config.gate.tail_sec * SR)
+        MAX = int(self.config.gate.max_sec * SR)
+        # Voice activity detector replaces peak detection in vad mode.
+        vad = VAD(self.config.gate.vad, SR, CHUNK) if self.config.gate.mode == "vad" else None
+        VOICED = self.config.gate.vad.min_voiced_sec
+        # Noise floor starts where the configured thresholds are its margins.
+        FLOOR = self.config.gate.floor
+        floor = (
+            NoiseFloor(PEAK - FLOOR.peak_margin_db, FLOOR.percentile, FLOOR.step_db)
+            if FLOOR.adaptive
+            else None
+        )
+        peak_th, rms_th = PEAK, RMS
         # Tensor to dBFS float, adds floor to avoid log(0).
         dbfs = lambda x: float(20 * log10(x + 1e-5))
+        # Mean square of integer samples in full scale, converted one second at a time.
+        power = (
+            lambda X: sum(square(X[i : i + SR] / FS).sum() for i in range(0, X.shape[0], SR))
+            / X.shape[0]
+        )
         # spls tracks current samples, mon tracks last broadcast sample position.
         # latest tracks last peak position, marker tracks sample position at gate open.
         spls = mon = latest = marker = spls_max
         peak = rms = dbfs(Tensor([0]))
         peaks = []
         gate = False
-        stream = self.audio.open(
-            SR, self.n_channels, self.frmt, input=True, frames_per_buffer=CHUNK
-        )
-        # Flush first buffer read to avoid possible noise.
-        stream.read(CHUNK, False)
+        # voiced counts voiced frames in current capture, rejected counts captures dropped by vad.
+        voiced = rejected = 0
+        # Capture is written in place as raw integer samples, initial size fits a short
+        # utterance plus hold and tail.
+        buffer = CaptureBuffer(2 * (HOLD + TAIL), MAX, dtype=self.config.channel.dtype)
+        stream = self.source
+        stream.open()
         while True:
-            x = frombuffer(stream.read(CHUNK, False), dtype=DTYPE) / FS
+            if (raw := stream.read()) is None:
+                # Finite sources end the process once they run out of audio.
+                if stream.exhausted:
+                    stream.close()
+                    break
+                continue
+            x = raw / FS
             peak = dbfs(tmax(abs(x)))
             peaks.append(peak)
             spls += CHUNK
-            # Broadcast peak, rms, position in seconds, and gate status.
+            # Follow background level, thresholds keep their margin over it.
+            if floor is not None:
+                floor.update(dbfs(sqrt(mean(square(x)))))
+                peak_th = floor.threshold(FLOOR.peak_margin_db, -60)
+                rms_th = floor.threshold(FLOOR.rms_margin_db, -60)
+                if vad is not None:
+                    vad.energy_db = floor.threshold(FLOOR.energy_margin_db, -80)
+            # Chunk is active if it has voiced frames (vad mode) or peaks over threshold.
+            n_voiced = int(vad(x).sum()) if vad is not None else 0
+            active = n_voiced > 0 if vad is not None else peak > peak_th
+            # Broadcast peak, rms, position in seconds, gate status and input stream counters.
             if spls - mon > REFRESH:
-                broadcast.mon(max(peaks), rms, max((spls_max - spls) / SR, 0), gate)
+                broadcast.mon(
+                    max(peaks),
+                    rms,
+                    max((spls_max - spls) / SR, 0),
+                    gate,
+                    overflows=stream.overflows,
+                    drops=stream.drops,
+                    rejected=rejected,
+                    floor=floor.value if floor is not None else None,
+                )
                 mon = spls
                 peaks = []
-            # Open gate, reset main tensor and sample markers.
-            if not gate and peak > PEAK:
-                X = Tensor([])
+            # Open gate, reset capture buffer and sample markers.
+            if not gate and active:
+                buffer.reset()
                 marker = latest = spls
+                # Time of the capture's first sample, from the source's clock.
+                opened_at = stream.time - CHUNK / SR
+                voiced = 0
                 gate = True
+                if features is not None:
+                    # Partial decodes only run while attending, like the full model.
+                    features.reset(attending=spls < spls_max)
             if gate:
-                # Concatenate tensor while gate is open.
-                X = cat((X, x), 0)
-                # Update latest peak position.
-                if peak > PEAK:
+                # Write raw samples into capture buffer while gate is open.
+                buffer.write(raw)
+                if features is not None:
+                    features.feed(x)
+                # Update latest active position.
+                if active:
                     latest = spls
-                # Close gate whenever current position minus latest peak position passes threshold.
-                if spls - latest > HOLD:
+                    voiced += n_voiced
+                # Close gate whenever current position minus latest peak position passes threshold
+                # or the capture reached its max length.
+                if spls - latest > HOLD or buffer.full:
                     gate = False
                     # Reduce size by HOLD sample size to exclude silence. Add tail to compensate.
-                    size = X.shape[0] - HOLD + TAIL
+                    size = len(buffer)
+                    if not buffer.full:
+                        size = min(size - HOLD + TAIL, size)
+                    X = buffer.view(size)
                     # Calculate rms and peak dBFS values (only moment where RMS is calculated).
-                    rms = dbfs(sqrt(mean(square(X[:size]))))
-                    peak = dbfs(tmax(abs(X[:size])))
-                    if rms < RMS:
+                    rms = dbfs(sqrt(power(X)))
+                    # Python ints, negating the int32 minimum would overflow as a Tensor.
+                    peak = dbfs(Tensor([max(int(X.max()), -int(X.min())) / FS]))
+                    # Drop quiet captures, reject clicks and bangs that only had a few voiced frames.
+                    quiet = rms < rms_th
+                    clicks = not quiet and vad is not None and voiced * vad.frame_sec < VOICED
+                    if quiet or clicks:
+                        rejected += clicks
+                        # Stop building features of the dropped capture.
+                        if features is not None:
+                            features.stop()
                         continue
-                    stream.stop_stream()
                     # Yields sample position at marker and capture, receive new sample position.
                     spls = mon = yield marker, Capture(
-                        data=X[:size],
+                        data=X,
                         size=size,
                         sr=SR,
                         dbpeak=peak,
                         dbrms=rms,
+                        features=features.finish(size) if features is not None else None,
+                        started_at=opened_at,
+                        ended_at=opened_at + size / SR,
                     )
                     # Exit process if outer process sent -1.
                     if spls == -1:
@@ -114,6 +210,3 @@ class AudioChannel:
                         break
                     # Yield to continue with generator pattern.
                     yield marker
-                    # Restart, same idea as above, flush first buffer read.
-                    stream.start_stream()
-                    stream.read(CHUNK, False)
@@ -0,0 +1,125 @@
+from whisper.audio import N_FFT, HOP_LENGTH, mel_filters, log_mel_spectrogram
+from torchaudio.transforms import Resample
+from torch import Tensor, cat, zeros, hann_window
+from torch.fft import rfft
+from math import gcd, ceil
+
+from app.audio.buffer import CaptureBuffer
+
+
+class FeatureBuilder:
+    """Whisper log-mel spectrogram built chunk by chunk while the gate is open.
+
+    Input chunks are resampled with enough context on both sides to match resampling
+    the whole capture, then every STFT frame whose window is complete is projected to mel.
+    finish only computes the last few frames (reflect padded, as torch.stft does) and the
+    log scaling, so features are ready as soon as the gate closes.
+    """
+
+    def __init__(
+        self,
+        resample: Resample | None,
+        samplerate: int,
+        model_samplerate: int,
+        n_mels: int,
+        max_sec: float = 600.0,
+    ) -> None:
+        divisor = gcd(samplerate, model_samplerate)
+        self.orig = samplerate // divisor
+        self.new = model_samplerate // divisor
+        self.resample = resample if samplerate != model_samplerate else None
+        # Context in input samples kept on each side of a resampled block, multiple of orig.
+        self.context = ceil(64 / self.orig) * self.orig if self.resample else 0
+        self.hann = hann_window(N_FFT)
+        self.filters = mel_filters("cpu", n_mels)
+        self.samples = CaptureBuffer(
+            30 * model_samplerate, int(max_sec * model_samplerate), n_buffers=1
+        )
+        self.reset()
+
+    def reset(self, attending: bool = True):
+        """Start a new capture. Left context starts as zeros, same as resampling padding.
+        attending is False if the capture can't be a prompt, see StreamingFeatures."""
+        self.pending = zeros(self.context)
+        self.samples.reset()
+        self.frames: list[Tensor] = []
+        self.n_frames = 0
+        self.n_input = 0
+
+    def feed(self, x: Tensor):
+        """Add chunk of float samples at input rate, compute all complete mel frames."""
+        self.n_input += x.shape[0]
+        if self.resample is None:
+            self.samples.write(x)
+        else:
+            self.pending = cat((self.pending, x))
+            self._resample()
+        self._frames()
+
+    def _resample(self, flush: bool = False):
+        """Resample pending input, keeping context on both sides of the block."""
+        C, X = self.context, self.pending
+        if flush:
+            X = cat((X, zeros(C + (-X.shape[0]) % self.orig)))
+        block = ((X.shape[0] - 2 * C) // self.orig) * self.orig
+        if block <= 0:
+            return
+        y = self.resample(X[: C + block + C])
+        self.samples.write(y[C * self.new // self.orig : (C + block) * self.new // self.orig])
+        self.pending = X[block:]
+
+    def _frames(self):
+        """Compute mel power of frames whose window ends within the resampled samples."""
+        a, half = self.samples.view(), N_FFT // 2
+        end = (a.shape[0] - half) // HOP_LENGTH + 1 if a.shape[0] > half else 0
+        if end <= self.n_frames:
+            return
+        start = self.n_frames * HOP_LENGTH - half
+        stop = (end - 1) * HOP_LENGTH + half
+        # First frames need the left reflect padding of torch.stft(center=True).
+        segment = cat((a[1 : half + 1].flip(0), a[:stop])) if start < 0 else a[start:stop]
+        self.frames.append(self._project(segment))
+        self.n_frames = end
+
+    def _project(self, segment: Tensor) -> Tensor:
+        """Mel power of all frames in segment, shape (n_mels, n_frames)."""
+        power = rfft(segment.unfold(0, N_FFT, HOP_LENGTH) * self.hann).abs().square()
+        return self.filters @ power.T
+
+    def finish(self, size: int = None) -> Tensor:
+        """Log-mel spectrogram of the first size input samples (all if None).
+        Same as whisper's log_mel_spectrogram of the resampled capture."""
+        if self.resample is not None:
+            self._resample(flush=True)
+        size = self.n_input if size is None else min(size, self.n_input)
+        n, half = min(round(size * self.new / self.orig), len(self.samples)), N_FFT // 2
+        a = self.samples.view(n)
+        # torch.stft frames minus the last one, same as whisper.
+        total = n // HOP_LENGTH
+        valid = min(self.n_frames, (n - half) // HOP_LENGTH + 1 if n > half else 0)
+        if valid == 0 or n <= N_FFT:
+            return log_mel_spectrogram(a, self.filters.shape[0])
+        # Remaining frames use the right reflect padding.
+        segment = cat((a[valid * HOP_LENGTH - half :], a[-half - 1 : -1].flip(0)))
+        mel = cat((cat(self.frames, dim=1)[:, :valid], self._project(segment)), dim=1)
+        return self._log(mel[:, :total])
+
+    def window(self, start: int, stop: int) -> tuple[Tensor, float] | None:
+        """Log-mel spectrogram of computed frames [start, stop) and its silence level.
+        Scaled like finish, 8 below the max of all frames so far, not just the window's.
+        Safe to call from another thread while chunks are being fed."""
+        frames = list(self.frames)
+        if not frames:
+            return None
+        mel = cat(frames, dim=1)[:, :stop]
+        top = mel.max().clamp(min=1e-10).log10()
+        return self._log(mel[:, start:], top), float(top + 4.0) / 4.0 - 2.0
+
+    def stop(self):
+        """Capture was dropped, nothing runs in the background here."""
+
+    def _log(self, mel: Tensor, top: Tensor = None) -> Tensor:
+        """Whisper's log scaling, dynamic range of 8 below the max log value (mel's by default)."""
+        log_spec = mel.clamp(min=1e-10).log10()
+        log_spec = log_spec.maximum((log_spec.max() if top is None else top) - 8.0)
+        return (log_spec + 4.0) / 4.0
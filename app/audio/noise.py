@@ -0,0 +1,21 @@
+class NoiseFloor:
+    """Running estimate of the background level in dBFS.
+
+    Tracks a low percentile of chunk levels with an exponential moving percentile:
+    every update moves the estimate up by step * percentile if the level is above it,
+    or down by step * (1 - percentile) if below. Constant time per chunk, no history.
+    """
+
+    def __init__(self, initial: float, percentile: float = 0.1, step: float = 0.5) -> None:
+        self.value = initial
+        self.percentile = percentile
+        self.step = step
+
+    def update(self, level: float) -> float:
+        """Update estimate with the level of the latest chunk and return it."""
+        self.value += self.step * (self.percentile - (level < self.value))
+        return self.value
+
+    def threshold(self, margin: float, lowest: float) -> float:
+        """Threshold margin dB over the estimate, clamped to [lowest, 0] dBFS."""
+        return min(max(self.value + margin, lowest), 0)
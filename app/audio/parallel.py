@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from whisper.audio import N_FRAMES, FRAMES_PER_SECOND
+from torch import Tensor
+import torch
+import os
+
+from app.system.config import TranscribeConfig
+
+# Transcribe instance of each worker process.
+_transcribe = None
+
+
+def _init(config: TranscribeConfig, samplerate: int, threads: int):
+    global _transcribe
+    from app.audio.transcribe import Transcribe
+
+    torch.set_num_threads(threads)
+    config = config.copy(deep=True)
+    config.parallel.enabled = config.screening.enabled = config.streaming.enabled = False
+    # Workers only decode, there is no idle timer to evict their model.
+    config.eviction.enabled = False
+    _transcribe = Transcribe(config, samplerate)
+
+
+def _decode(mel: Tensor, no_speech_threshold: float, silence: float) -> str:
+    return _transcribe.decode(mel, no_speech_threshold, silence=silence)
+
+
+class ParallelDecoder:
+    """Decode long captures as segments of up to 30 s on a pool of worker processes.
+
+    Segments end at the quietest frame within search_sec before each 30 s boundary,
+    so words are rarely cut. Every worker loads its own model and gets an equal share
+    of the cores for torch's intra-op threads.
+    """
+
+    def __init__(self, config: TranscribeConfig, samplerate: int) -> None:
+        cores = os.cpu_count() or 1
+        self.workers = config.parallel.workers or cores
+        self.min_frames = int(config.parallel.min_sec * FRAMES_PER_SECOND)
+        self.search_frames = int(config.parallel.search_sec * FRAMES_PER_SECOND)
+        self.pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=get_context("spawn"),
+            initializer=_init,
+            initargs=(config, samplerate, max(cores // self.workers, 1)),
+        )
+        # Start every worker now so models load in the background.
+        for _ in range(self.workers):
+            self.pool.submit(int)
+
+    def split(self, mel: Tensor) -> list[int]:
+        """Segment end frames, each segment at most N_FRAMES long."""
+        # Frame loudness smoothed over 100 ms.
+        energy = mel.mean(0)
+        energy = torch.nn.functional.avg_pool1d(energy[None], 11, 1, 5, count_include_pad=False)[0]
+        ends, start, total = [], 0, mel.shape[-1]
+        while total - start > N_FRAMES:
+            lo = start + N_FRAMES - self.search_frames
+            start = lo + int(energy[lo : start + N_FRAMES].argmin())
+            ends.append(start)
+        return ends + [total]
+
+    def decode(self, mel: Tensor, no_speech_threshold: float = 0.6) -> str:
+        """Decode segments concurrently and join their text in order."""
+        silence = float(mel.max()) - 2.0
+        ends = self.split(mel)
+        starts = [0, *ends[:-1]]
+        futures = [
+            self.pool.submit(_decode, mel[:, a:b].clone(), no_speech_threshold, silence)
+            for a, b in zip(starts, ends)
+        ]
+        return " ".join(text for f in futures if (text := f.result())).strip()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,31 +1,213 @@
-from subprocess import Popen, PIPE
-from threading import Thread
-from typing import BinaryIO
+from concurrent.futures import Future, InvalidStateError, wait
+from subprocess import Popen, PIPE, DEVNULL
+from pyaudio import PyAudio, paContinue
+from threading import Lock, Thread
+from queue import Queue
+from torchaudio.functional import resample
+from torchaudio import load
+from collections import deque
+from time import perf_counter
+from typing import Iterable
+from io import BytesIO
 
+from app.system.config import AudioConfig
 from app.system.logger import log_json
 
 
-class Player:
-    """Audio player using ffmpeg"""
+def resolve(future: Future, result=None):
+    """Complete future, unless it was cancelled."""
+    try:
+        future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def drop(future: Future):
+    """Cancel future and wake up its waiters."""
+    if future.cancel():
+        try:
+            future.set_running_or_notify_cancel()
+        except RuntimeError:
+            # already notified
+            pass
+
+
+class JitterBuffer:
+    """PCM bytes between the decoder and the output stream callback.
+
+    The callback always gets the bytes it asks for, padded with silence when the buffer runs
+    dry, so the device stays open between clips and a clip queued before the previous one
+    ends plays without a gap. The gap before each clip is kept, 0 when it was gapless.
+    Each clip's future completes once its last byte is taken, its started future, if any,
+    with the time its first byte is taken. clear cancels them.
+    """
 
     def __init__(self) -> None:
-        self.is_playing = False
-        self.threads: list[Thread] = []
-
-    def queue(self, file: BinaryIO):
-        """Queue file for playback. Start playback thread if not already started."""
-        if file is None:
-            return log_json({"error": "Can't play None file."})
-        self.threads.append(Thread(target=self._ffplay, args=[file]))
-        # go over all threads
-        while self.threads:
-            if not self.is_playing:
-                thread = self.threads.pop()
-                thread.start()
-                break
-
-    def _ffplay(self, file: BinaryIO):
-        """Playback files in queue using ffmpeg."""
+        self.chunks: deque[tuple[bytes, Future, Future | None]] = deque()
+        self.offset = 0
+        self.size = 0
+        self.lock = Lock()
+        self.ended_at = None
+        self.starting = False
+        self.gaps: list[float] = []
+
+    def put(self, data: bytes, future: Future, started: Future = None):
+        """Add a clip, unless its future was cancelled (clear may have run already)."""
+        with self.lock:
+            if future.cancelled():
+                return
+            if self.size:
+                self.gaps.append(0.0)
+            else:
+                self.starting = True
+            self.chunks.append((data, future, started))
+            self.size += len(data)
+
+    def get(self, n: int) -> bytes:
+        """Next n bytes, silence padded."""
+        parts, missing = [], n
+        with self.lock:
+            if self.starting and self.size:
+                if self.ended_at is not None:
+                    self.gaps.append(perf_counter() - self.ended_at)
+                self.starting = False
+            while missing and self.chunks:
+                chunk, future, started = self.chunks[0]
+                if started is not None and self.offset == 0:
+                    resolve(started, perf_counter())
+                part = chunk[self.offset : self.offset + missing]
+                parts.append(part)
+                missing -= len(part)
+                self.offset += len(part)
+                if self.offset == len(chunk):
+                    self.chunks.popleft()
+                    self.offset = 0
+                    resolve(future)
+            self.size -= n - missing
+            if parts and not self.size:
+                # ran dry in this call
+                self.ended_at = perf_counter()
+        return b"".join(parts) + bytes(missing)
+
+    def clear(self):
+        with self.lock:
+            for _, *futures in self.chunks:
+                for future in filter(None, futures):
+                    drop(future)
+            self.chunks.clear()
+            self.offset = self.size = 0
+            self.starting = False
+
+
+class Player:
+    """Audio player using ffmpeg, or a PyAudio output stream.
+
+    A single worker thread plays queued audio in order. queue returns right away with a
+    Future that completes once the audio has played, futures stay pending until then so
+    cancel can drop them. cancel stops what is playing and drops everything queued,
+    so speech can be interrupted. Jobs stay in pending from queue until the worker is done
+    with them, under a lock shared with cancel, so a job the worker just took is dropped too.
+
+    The ffplay backend starts a process for every clip. The pyaudio backend decodes ogg
+    in-process and writes PCM to a JitterBuffer read by a single long-lived output stream,
+    the next clip is decoded while the current one plays. Ogg is decoded whole, so a clip
+    starts once all of it has arrived, ffplay starts on its first chunk.
+    """
+
+    def __init__(self, config: AudioConfig, audio: PyAudio = None) -> None:
+        self.config = config.player
+        self.samplerate = config.channel.samplerate
+        self.dtype = config.channel.dtype
+        self.frmt = config.channel.splformat
+        self.fullscale = config.channel.fullscale
+        self.audio = audio
+        self.stream = None
+        self.buffer = JitterBuffer()
+        # scheduler
+        self.jobs: Queue[tuple[Iterable[bytes], Future, Future | None]] = Queue()
+        self.pending: dict[Future, tuple[Iterable[bytes], Future, Future | None]] = {}
+        self.lock = Lock()
+        self.last: Future = None
+        # queue and done times of the latest clips, done is None until then
+        self.spans: deque[list[float | None]] = deque(maxlen=64)
+        self.proc: Popen = None
+        self.worker = Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    @property
+    def is_playing(self) -> bool:
+        return self.last is not None and not self.last.done()
+
+    def played_between(self, start: float, end: float) -> bool:
+        """Check if audio was queued or playing at any point between perf_counter times
+        start and end, such as while a capture was recorded."""
+        return any(
+            queued <= end and (done is None or done >= start) for queued, done in self.spans
+        )
+
+    def queue(self, audio: Iterable[bytes], started: Future = None) -> Future | None:
+        """Queue ogg audio chunks for playback, returns a Future that completes once played.
+        started, if given, completes with the perf_counter time of the first write."""
+        if audio is None:
+            return log_json({"error": "Can't play None audio."})
+        future = Future()
+        with self.lock:
+            self.pending[future] = job = (audio, future, started)
+            self.jobs.put(job)
+            self.last = future
+        span = [perf_counter(), None]
+        self.spans.append(span)
+
+        def done(future: Future):
+            span[1] = perf_counter()
+
+        future.add_done_callback(done)
+        return future
+
+    def wait(self, timeout: float = None):
+        """Wait until queued audio has played or was cancelled."""
+        if self.last is not None:
+            wait([self.last], timeout)
+
+    def cancel(self):
+        """Stop the current audio and drop the queued ones, the worker skips them."""
+        with self.lock:
+            jobs = list(self.pending.values())
+            self.pending.clear()
+            for audio, future, started in jobs:
+                drop(future)
+                if started is not None:
+                    drop(started)
+                if hasattr(audio, "close"):
+                    audio.close()
+            if (proc := self.proc) is not None:
+                proc.terminate()
+        # after the futures are dropped, so a clip can't be put back
+        self.buffer.clear()
+
+    def work(self):
+        """Worker thread, plays jobs in order until None is queued."""
+        while (job := self.jobs.get()) is not None:
+            audio, future, started = job
+            with self.lock:
+                if future.cancelled():
+                    continue
+            try:
+                if self.config.backend == "pyaudio":
+                    self._pyaudio(audio, future, started)
+                else:
+                    self._ffplay(audio, future, started)
+            except BaseException as e:
+                log_json({"error": f"Could not play audio: {e}"})
+                drop(future)
+                if started is not None:
+                    drop(started)
+            with self.lock:
+                self.pending.pop(future, None)
+
+    def _ffplay(self, audio: Iterable[bytes], future: Future, started: Future = None):
+        """Playback audio using ffmpeg. Chunks are piped as they arrive,
+        so playback starts before the whole audio is available."""
         # ['ffmpeg', '-i', 'pipe:', '-f', 'wav', '-ar', f'{SR}', 'pipe:']
         cmd = [
             "ffplay",
@@ -38,10 +220,67 @@ class Player:
             "-loglevel",
             "quiet",
         ]
-        self.is_playing = True
-        file.seek(0)
-        proc = Popen(cmd, stdout=PIPE, stdin=PIPE)
-        proc.communicate(input=file.read())
+        self.proc = proc = Popen(cmd, stdout=DEVNULL, stdin=PIPE)
+        try:
+            for chunk in audio:
+                if future.cancelled():
+                    break
+                proc.stdin.write(chunk)
+                proc.stdin.flush()
+                if started is not None:
+                    resolve(started, perf_counter())
+            proc.stdin.close()
+        except BrokenPipeError as e:
+            log_json({"error": f"Playback stopped: {e}"})
         proc.wait()
-        file.close()
-        self.is_playing = False
+        self.proc = None
+        if started is not None:
+            drop(started)
+        resolve(future)
+
+    def _pyaudio(self, audio: Iterable[bytes], future: Future, started: Future = None):
+        """Decode audio and add it to the jitter buffer, the output stream plays it
+        while the worker moves on to the next clip. Waits for the whole clip to decode it."""
+        data = self.decode(b"".join(audio))
+        if future.cancelled():
+            return
+        self.open()
+        self.buffer.put(data, future, started)
+
+    def decode(self, data: bytes) -> bytes:
+        """Ogg to mono PCM bytes in the channel's format."""
+        X, sr = load(BytesIO(data), format="ogg")
+        X = X.mean(0)
+        if sr != self.samplerate:
+            X = resample(X, sr, self.samplerate)
+        X = (X * self.fullscale).clamp(-self.fullscale, self.fullscale - 1)
+        return X.type(self.dtype).numpy().tobytes()
+
+    def callback(self, data: bytes | None, frame_count: int, time_info: dict, status: int):
+        """PyAudio stream callback, runs on PortAudio's thread."""
+        return self.buffer.get(frame_count * self.dtype.itemsize), paContinue
+
+    def open(self):
+        """Open the output stream once, it stays open until close."""
+        if self.stream is not None:
+            return
+        if self.audio is None:
+            self.audio = PyAudio()
+        self.stream = self.audio.open(
+            self.samplerate,
+            1,
+            self.frmt,
+            output=True,
+            frames_per_buffer=int(self.samplerate * self.config.latency_ms / 1000),
+            stream_callback=self.callback,
+        )
+        self.stream.start_stream()
+
+    def close(self):
+        """Stop playback and the worker, close the output stream."""
+        self.cancel()
+        self.jobs.put(None)
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
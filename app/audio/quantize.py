@@ -0,0 +1,41 @@
+from whisper import load_model, Whisper
+from whisper.model import Linear
+from torch.ao.quantization import quantize_dynamic
+from torch import nn, qint8
+from pathlib import Path
+import torch
+import os
+
+
+def cache_dir() -> Path:
+    """Same directory whisper downloads its checkpoints to."""
+    default = Path.home() / ".cache"
+    return Path(os.getenv("XDG_CACHE_HOME", default)) / "whisper"
+
+
+def load_quantized(name: str, root: Path = None) -> Whisper:
+    """Whisper model with int8 dynamically quantized linear layers, for CPU inference.
+
+    The quantized model is saved next to whisper's checkpoints on first load, keyed by
+    model name and torch version, so later startups skip loading float weights.
+    """
+    root = cache_dir() if root is None else Path(root)
+    path = root / f"{name}-int8-torch{torch.__version__}.pt"
+    if path.exists():
+        return torch.load(path, map_location="cpu", weights_only=False)
+    model = quantize(load_model(name, device="cpu"))
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    torch.save(model, tmp)
+    os.replace(tmp, path)
+    return model
+
+
+def quantize(model: Whisper) -> Whisper:
+    """Quantize linear layer weights to int8, activations are quantized on the fly.
+    Whisper's Linear only casts weights to the input dtype, so it is swapped for nn.Linear,
+    which is what the dynamic quantization mappings recognize."""
+    for module in model.modules():
+        if type(module) is Linear:
+            module.__class__ = nn.Linear
+    return quantize_dynamic(model, {nn.Linear}, dtype=qint8)
@@ -41,6 +41,10 @@ class Recorder:
             log_json({"error": f"Could not read ogg file to tape: {e}"})
             return None
 
+    def clear_tape(self):
+        """Drop the internal tape, e.g. of an interrupted answer."""
+        self.tape = None
+
     def save_tape(self, filepath: str):
         """Record internal tape to filepath and set it to None."""
         try:
@@ -57,15 +61,13 @@ class Recorder:
         https://pytorch.org/audio/stable/backend.html
 
         Args:
-            X (Tensor): Tensor.
+            X (Tensor): Tensor of raw integer samples, or float samples in [-1, 1).
             filepath (str): Filepath.
         """
+        if X.is_floating_point():
+            X = (X * self.ceiling).type(self.dtype)
         try:
-            save(
-                filepath,
-                (X * self.ceiling).type(self.dtype).reshape((1, -1)),
-                sample_rate=self.samplerate,
-            )
+            save(filepath, X.reshape((1, -1)), sample_rate=self.samplerate)
         except BaseException as e:
             print(f"Could not save tensor as file {e}")
             return None
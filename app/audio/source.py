@@ -0,0 +1,158 @@
+from torch import Tensor, Generator as RNG, arange, randn, sin, zeros
+from torch.nn.functional import pad
+from torchaudio.functional import resample
+from typing import Generator
+from torchaudio import load
+from pathlib import Path
+from time import perf_counter, sleep
+from math import pi
+
+from app.system.config import ChannelConfig
+
+AUDIO_SUFFIXES = (".wav", ".ogg", ".flac")
+
+
+class AudioSource:
+    """Input source for AudioChannel.start.
+
+    Sources deliver chunks of `chunk` samples as integer Tensors of the channel's dtype.
+    read returns None if no chunk is available within timeout, finite sources set
+    exhausted once they run out of audio. realtime is False for sources read as fast as
+    possible. time is the perf_counter time at the end of the last chunk read, from its
+    arrival or the source's sample clock.
+    """
+
+    overflows: int = 0
+    drops: int = 0
+    exhausted: bool = False
+    realtime: bool = True
+    time: float = None
+
+    def open(self):
+        ...
+
+    def read(self, timeout: float = 1.0) -> Tensor | None:
+        ...
+
+    def close(self):
+        ...
+
+
+class GeneratedSource(AudioSource):
+    """Source backed by a generator of float chunks in [-1, 1).
+    Converts chunks to the channel's integer format and paces them at real time if set.
+    """
+
+    def __init__(self, config: ChannelConfig, realtime: bool = True) -> None:
+        self.samplerate = config.samplerate
+        self.chunk = config.chunk
+        self.dtype = config.dtype
+        self.fullscale = config.fullscale
+        self.realtime = realtime
+        self.chunks = None
+
+    def generate(self) -> Generator[Tensor, None, None]:
+        ...
+
+    def open(self):
+        self.exhausted = False
+        self.chunks = self.generate()
+        self.n_chunks = 0
+        self.t0 = perf_counter()
+
+    def read(self, timeout: float = 1.0) -> Tensor | None:
+        if self.exhausted or (x := next(self.chunks, None)) is None:
+            self.exhausted = True
+            return None
+        # Wait until the chunk would have been recorded.
+        if self.realtime:
+            delay = self.t0 + self.n_chunks * self.chunk / self.samplerate - perf_counter()
+            if delay > 0:
+                sleep(delay)
+        self.n_chunks += 1
+        self.time = self.t0 + self.n_chunks * self.chunk / self.samplerate
+        FS = self.fullscale
+        return (x * FS).round().clamp(-FS, FS - 1).type(self.dtype)
+
+    def close(self):
+        self.chunks = None
+
+    def split(self, X: Tensor) -> Generator[Tensor, None, None]:
+        """Yield X in chunks, zero padding the last one."""
+        for i in range(0, X.shape[0], self.chunk):
+            x = X[i : i + self.chunk]
+            yield pad(x, (0, self.chunk - x.shape[0])) if x.shape[0] < self.chunk else x
+
+    def silence(self, seconds: float) -> Generator[Tensor, None, None]:
+        for _ in range(int(seconds * self.samplerate / self.chunk)):
+            yield zeros(self.chunk)
+
+
+class FileSource(GeneratedSource):
+    """Replay an audio file or every audio file in a directory (sorted by name).
+    Files are downmixed, resampled to the channel rate and separated by gap_sec of silence
+    so the gate closes after each one. Use realtime=False to feed them as fast as possible.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        config: ChannelConfig,
+        realtime: bool = True,
+        gap_sec: float = 4.0,
+        pattern: str = "*",
+    ) -> None:
+        super().__init__(config, realtime)
+        path = Path(path)
+        self.files = (
+            sorted(p for p in path.glob(pattern) if p.suffix.lower() in AUDIO_SUFFIXES)
+            if path.is_dir()
+            else [path]
+        )
+        self.gap_sec = gap_sec
+
+    def generate(self) -> Generator[Tensor, None, None]:
+        for file in self.files:
+            X, sr = load(file)
+            X = X.mean(0)
+            if sr != self.samplerate:
+                X = resample(X, sr, self.samplerate)
+            yield from self.split(X)
+            yield from self.silence(self.gap_sec)
+
+
+class SignalSource(GeneratedSource):
+    """Synthetic tone bursts over a noise floor, deterministic for a given seed.
+    A tone of tone_hz plays for on_sec every on_sec + off_sec, for a total of seconds.
+    """
+
+    def __init__(
+        self,
+        config: ChannelConfig,
+        realtime: bool = True,
+        seconds: float = 60.0,
+        tone_hz: float = 220.0,
+        tone_db: float = -12.0,
+        noise_db: float = -60.0,
+        on_sec: float = 2.0,
+        off_sec: float = 4.0,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(config, realtime)
+        self.seconds = seconds
+        self.tone_hz = tone_hz
+        self.tone_gain = 10 ** (tone_db / 20)
+        self.noise_gain = 10 ** (noise_db / 20)
+        self.on_sec = on_sec
+        self.period_sec = on_sec + off_sec
+        self.seed = seed
+
+    def generate(self) -> Generator[Tensor, None, None]:
+        rng = RNG().manual_seed(self.seed)
+        SR, CHUNK = self.samplerate, self.chunk
+        for i in range(int(self.seconds * SR / CHUNK)):
+            t = (arange(CHUNK) + i * CHUNK) / SR
+            x = randn(CHUNK, generator=rng) * self.noise_gain
+            tone = (t % self.period_sec) < self.on_sec
+            x += tone * sin(2 * pi * self.tone_hz * t) * self.tone_gain
+            yield x
@@ -0,0 +1,113 @@
+from pyaudio import PyAudio, paContinue, paInputOverflow
+from torch import Tensor, dtype, frombuffer
+from collections import deque
+from threading import Event
+from time import perf_counter
+
+from app.audio.source import AudioSource
+
+
+class ChunkQueue:
+    """Bounded single producer, single consumer queue of audio chunks and their arrival time.
+
+    deque.append and deque.popleft are atomic in CPython, so the producer (audio callback)
+    never waits on the consumer. When the queue is full incoming chunks are dropped and counted.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.chunks: deque[tuple[float, bytes]] = deque()
+        self.ready = Event()
+        self.drops = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def put(self, chunk: tuple[float, bytes]) -> bool:
+        """Append chunk without blocking. Returns False if it was dropped."""
+        if len(self.chunks) >= self.maxsize:
+            self.drops += 1
+            return False
+        self.chunks.append(chunk)
+        self.ready.set()
+        return True
+
+    def get(self, timeout: float = None) -> tuple[float, bytes] | None:
+        """Pop oldest chunk, wait up to timeout seconds if empty. Returns None on timeout."""
+        while not self.chunks:
+            self.ready.clear()
+            # Producer may have appended between the check and the clear.
+            if self.chunks:
+                break
+            if not self.ready.wait(timeout):
+                return None
+        return self.chunks.popleft()
+
+    def clear(self):
+        self.chunks.clear()
+
+
+class InputStream(AudioSource):
+    """PyAudio input stream in callback mode.
+    PortAudio calls back on its own thread and chunks are pushed to a ChunkQueue,
+    so recording never stops while the consumer is busy.
+    """
+
+    def __init__(
+        self,
+        audio: PyAudio,
+        samplerate: int,
+        channels: int,
+        frmt: int,
+        chunk: int,
+        max_chunks: int,
+        dtype: dtype,
+    ) -> None:
+        self.audio = audio
+        self.samplerate = samplerate
+        self.n_channels = channels
+        self.frmt = frmt
+        self.dtype = dtype
+        self.chunk = chunk
+        self.queue = ChunkQueue(max_chunks)
+        self.overflows = 0
+        self.stream = None
+
+    @property
+    def drops(self) -> int:
+        return self.queue.drops
+
+    def callback(self, data: bytes, frame_count: int, time_info: dict, status: int):
+        """PyAudio stream callback, runs on PortAudio's thread."""
+        if status & paInputOverflow:
+            self.overflows += 1
+        self.queue.put((perf_counter(), data))
+        return None, paContinue
+
+    def open(self):
+        """Open and start the callback stream."""
+        self.queue.clear()
+        self.stream = self.audio.open(
+            self.samplerate,
+            self.n_channels,
+            self.frmt,
+            input=True,
+            frames_per_buffer=self.chunk,
+            stream_callback=self.callback,
+        )
+        self.stream.start_stream()
+        # Flush first buffer read to avoid possible noise.
+        self.queue.get(1.0)
+
+    def read(self, timeout: float = 1.0) -> Tensor | None:
+        """Next chunk from queue, None if nothing arrived within timeout."""
+        if (item := self.queue.get(timeout)) is None:
+            return None
+        self.time, data = item
+        return frombuffer(data, dtype=self.dtype)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
@@ -0,0 +1,144 @@
+from whisper.audio import FRAMES_PER_SECOND, N_FRAMES
+from torchaudio.transforms import Resample
+from threading import Thread, Event
+from torch import Tensor
+import time
+
+from app.audio.features import FeatureBuilder
+from app.system.config import StreamingConfig
+from app.types import Broadcast
+
+# Mel frames per timestamp token (20 ms).
+FRAMES_PER_TIMESTAMP = 2
+
+
+class StreamingFeatures(FeatureBuilder):
+    """Feature builder that transcribes the capture while it is being recorded.
+
+    A worker thread decodes the uncommitted window of features every step_sec of audio.
+    Once the window is at least window_sec long, every complete segment but the last one
+    is committed and the window moves past it, so when the gate closes only the tail
+    has to be decoded. Committed plus tentative text is broadcast as it changes.
+    Captures that start while the assistant isn't attending aren't decoded until they end,
+    so screening keeps its savings. Partial decodes count in the full tier's stats.
+    """
+
+    no_speech_threshold: float = 0.6
+
+    def __init__(
+        self,
+        transcribe,
+        config: StreamingConfig,
+        resample: Resample | None,
+        samplerate: int,
+        model_samplerate: int,
+        n_mels: int,
+        broadcast: Broadcast = None,
+    ) -> None:
+        """Transcribe provides the model and decoding, broadcast receives partial text."""
+        self.transcribe = transcribe
+        self.broadcast = broadcast
+        self.step_frames = int(config.step_sec * FRAMES_PER_SECOND)
+        self.window_frames = int(config.window_sec * FRAMES_PER_SECOND)
+        self.worker: Thread = None
+        super().__init__(resample, samplerate, model_samplerate, n_mels)
+
+    def reset(self, attending: bool = True):
+        """Start a new capture, and its decoding worker if attending."""
+        self.stop()
+        super().reset()
+        # committed is the first uncommitted frame, decoded the frame count at last decode.
+        self.committed = self.decoded = 0
+        self.tokens: list[int] = []
+        self.texts: list[str] = []
+        self.done, self.wake = Event(), Event()
+        if attending:
+            self.worker = Thread(target=self.run, daemon=True)
+            self.worker.start()
+
+    def feed(self, x: Tensor):
+        super().feed(x)
+        if self.n_frames - self.decoded >= self.step_frames:
+            self.wake.set()
+
+    def finish(self, size: int = None) -> Tensor:
+        """Stop worker (waits for a decode in progress) and return the capture's features."""
+        self.stop()
+        return super().finish(size)
+
+    def stop(self):
+        """Stop the worker, also called when the capture is dropped."""
+        if self.worker is not None:
+            self.done.set()
+            self.wake.set()
+            self.worker.join()
+            self.worker = None
+
+    def complete(self, mel: Tensor, no_speech_threshold: float = no_speech_threshold) -> str:
+        """Full text of the capture, decoding only the frames after the committed ones."""
+        tail = mel[:, self.committed :]
+        text = (
+            self.transcribe.decode(
+                tail, no_speech_threshold, prompt=self.tokens, silence=float(mel.max()) - 2.0
+            )
+            if tail.shape[-1] > 0
+            else ""
+        )
+        return " ".join([*self.texts, text]).strip()
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            if self.done.is_set():
+                return
+            self.step()
+
+    def step(self):
+        """Decode uncommitted window with timestamps, commit stable segments, broadcast text."""
+        transcribe, tier = self.transcribe, self.transcribe.tiers["full"]
+        model = tier.model
+        self.decoded = stop = self.n_frames
+        mel, silence = self.window(self.committed, stop) or (None, None)
+        # Nothing to do while the full model is evicted, complete decodes the whole capture.
+        if model is None or mel is None or mel.shape[-1] == 0:
+            return
+        cpu, wall = time.thread_time(), time.perf_counter()
+        result = transcribe.decode_with_fallback(
+            transcribe.segment(mel[:, :N_FRAMES], silence, model),
+            transcribe.initial_prompt_tokens + self.tokens,
+            timestamps=True,
+            model=model,
+        )
+        tier.partials += 1
+        tier.cpu_sec += time.thread_time() - cpu
+        tier.wall_sec += time.perf_counter() - wall
+        if transcribe.is_silence(result, self.no_speech_threshold):
+            return
+        segments, rest = self.split(result.tokens)
+        # Commit all complete segments but the last unless the window got too long.
+        if stop - self.committed >= self.window_frames:
+            commit = segments if rest or stop - self.committed >= N_FRAMES // 2 else segments[:-1]
+            for end, tokens in commit:
+                self.tokens.extend(tokens)
+                self.texts.append(transcribe.tokenizer.decode(tokens).strip())
+            if commit:
+                self.committed += commit[-1][0]
+                segments = segments[len(commit) :]
+        tentative = [transcribe.tokenizer.decode(tokens).strip() for _, tokens in segments]
+        tentative.append(transcribe.tokenizer.decode(rest).strip())
+        if self.broadcast is not None:
+            self.broadcast.partial(" ".join([*self.texts, *tentative]).strip())
+
+    def split(self, tokens: list[int]) -> tuple[list[tuple[int, list[int]]], list[int]]:
+        """Split decoded tokens into (end frame, text tokens) segments using timestamp tokens.
+        Also returns the trailing text tokens that have no closing timestamp."""
+        begin = self.transcribe.tokenizer.timestamp_begin
+        segments, text = [], []
+        for token in tokens:
+            if token < begin:
+                text.append(token)
+            elif text:
+                segments.append(((token - begin) * FRAMES_PER_TIMESTAMP, text))
+                text = []
+        return segments, text
@@ -1,13 +1,62 @@
+from whisper import load_model, decode, DecodingOptions, DecodingResult, Whisper
+from concurrent.futures import ThreadPoolExecutor
+from whisper.audio import N_FRAMES, FRAMES_PER_SECOND, log_mel_spectrogram
+from whisper.tokenizer import Tokenizer, get_tokenizer
 from torchaudio.transforms import Resample
-from torch import Tensor, float32, dtype
-from whisper import load_model
+from torch import Tensor, float32, dtype, zeros
+from torch.nn.functional import pad
+from functools import partial
+from threading import Lock, Timer
+import asyncio
+import time
+import gc
+import os
 
-from app.system.config import TranscribeConfig
+from app.audio.streaming import StreamingFeatures, FRAMES_PER_TIMESTAMP
+from app.audio.quantize import load_quantized
+from app.audio.parallel import ParallelDecoder
+from app.audio.features import FeatureBuilder
+from app.audio.capture import normalize
+from app.system.config import TranscribeConfig, DecodingProfile
+from app.system.logger import log_json
+from app.types import Broadcast
 
 
 __all__ = ["Transcribe"]
 
 
+def rss_mb() -> float | None:
+    """Resident memory of this process in MB, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+class Tier:
+    """Whisper model with its call count, CPU and wall time. Partial decodes of streaming
+    captures are counted apart from calls, their time is included."""
+
+    def __init__(self, name: str, model: Whisper) -> None:
+        self.name = name
+        self.model = model
+        self.calls = 0
+        self.partials = 0
+        self.cpu_sec = 0.0
+        self.wall_sec = 0.0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "tier": self.name,
+            "calls": self.calls,
+            "partials": self.partials,
+            "cpu_sec": round(self.cpu_sec, 3),
+            "wall_sec": round(self.wall_sec, 3),
+        }
+
+
 class Transcribe:
     """Use Whisper for STT"""
 
@@ -25,28 +74,339 @@ class Transcribe:
         self.model_dtype = model_dtype
         self.model_samplerate = model_samplerate
         # ml
-        self.model = load_model(self.config.model)
+        self.model = self.load_model(self.config.model)
+        self.n_mels = self.model.dims.n_mels
+        self.is_multilingual = self.model.is_multilingual
+        self.tiers = {"full": Tier("full", self.model)}
+        if self.config.screening.enabled:
+            self.tiers["screen"] = Tier("screen", self.load_model(self.config.screening.model))
+        self.tokenizer = get_tokenizer(
+            self.is_multilingual, language=self.config.language, task="transcribe"
+        )
+        # eviction, full model is unloaded after idle_min without full transcriptions.
+        self.evictions = self.reloads = 0
+        self.reload_sec = 0.0
+        self.idle: Timer = None
+        self.last_used = time.monotonic()
         self.resample = Resample(samplerate, model_samplerate, dtype=model_dtype)
+        # streaming
+        self.stream: StreamingFeatures = None
+        self.parallel = (
+            ParallelDecoder(self.config, samplerate) if self.config.parallel.enabled else None
+        )
+        # worker, warm up runs first so the first capture doesn't pay for lazy init.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcribe")
+        # Whisper installs kv-cache hooks per decode, models can't decode concurrently.
+        self.lock = Lock()
+        self.requests = asyncio.Semaphore(self.config.max_requests)
+        self.executor.submit(self.warmup)
+        self.touch()
+
+    def load_model(self, name: str) -> Whisper:
+        """Load whisper model, int8 quantized for CPU inference if enabled."""
+        if self.config.quantize:
+            return load_quantized(name)
+        return load_model(name)
+
+    def touch(self):
+        """Restart the idle timer, eviction runs on the worker between transcriptions."""
+        self.last_used = time.monotonic()
+        if not self.config.eviction.enabled:
+            return
+        if self.idle is not None:
+            self.idle.cancel()
+        self.idle = Timer(self.idle_sec, self.executor.submit, args=(self.evict,))
+        self.idle.daemon = True
+        self.idle.start()
+
+    @property
+    def idle_sec(self) -> float:
+        return self.config.eviction.idle_min * 60
+
+    def evict(self):
+        """Unload the full model. Captures are screened with the small model until a trigger
+        needs the full one again, the screen tier is loaded here if it wasn't enabled
+        and unloaded again on reload. Skipped if the model was used since the timer fired."""
+        if self.model is None or time.monotonic() - self.last_used < self.idle_sec:
+            return
+        if not self.screening:
+            self.tiers["screen"] = Tier("screen", self.load_model(self.config.screening.model))
+        before = rss_mb()
+        with self.lock:
+            self.model = self.tiers["full"].model = None
+        gc.collect()
+        self.evictions += 1
+        log_json({"transcribe": {"evicted": self.config.model, **self.memory(before)}})
+
+    def reload(self):
+        """Load the evicted full model back, called on the worker by the next full decode."""
+        before, t = rss_mb(), time.perf_counter()
+        self.model = self.tiers["full"].model = self.load_model(self.config.model)
+        if not self.config.screening.enabled:
+            self.tiers.pop("screen", None)
+        self.reload_sec = time.perf_counter() - t
+        self.reloads += 1
+        log_json(
+            {
+                "transcribe": {
+                    "reloaded": self.config.model,
+                    "reload_sec": round(self.reload_sec, 3),
+                    **self.memory(before),
+                }
+            }
+        )
+
+    def memory(self, before: float | None) -> dict:
+        after = rss_mb()
+        return {
+            "rss_mb": round(after, 1) if after is not None else None,
+            "rss_delta_mb": round(after - before, 1) if None not in (before, after) else None,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
 
     def update_initial_prompt(self, text: str):
         """Add given text to start of initial prompt, comma separated."""
         self.config.initial_prompt = f"{text}, {self.config.initial_prompt}"
 
     def transform(self, X: Tensor):
-        """Convert tensor to model compatible form."""
+        """Convert tensor to model compatible form, integer samples are normalized here."""
+        X = normalize(X)
         if X.dtype != self.model_dtype:
             X = X.type(self.model_dtype)
         if self.samplerate != self.model_samplerate:
             return self.resample(X)
         return X
 
-    def predict(self, X: Tensor, no_speech_threshold: float = 0.6) -> str:
-        """Transcribe speech to text using torch Tensor data."""
-        y_pred = self.model.transcribe(
-            self.transform(X),
-            fp16=self.config.fp16,
-            language=self.config.language,
-            initial_prompt=self.config.initial_prompt,
-            no_speech_threshold=no_speech_threshold,
+    def features(self, broadcast: Broadcast = None) -> FeatureBuilder:
+        """New incremental log-mel builder for captures at the input samplerate.
+        If streaming is enabled it also transcribes while recording, broadcasting partial text."""
+        args = (self.resample, self.samplerate, self.model_samplerate, self.n_mels)
+        if not self.config.streaming.enabled:
+            return FeatureBuilder(*args)
+        self.stream = StreamingFeatures(self, self.config.streaming, *args, broadcast=broadcast)
+        return self.stream
+
+    def log_mel(self, X: Tensor, model: Whisper = None) -> Tensor:
+        """Log-mel spectrogram of a whole capture, with the mel bins of model (full by default)."""
+        n_mels = self.n_mels if model is None else model.dims.n_mels
+        return log_mel_spectrogram(self.transform(X), n_mels)
+
+    @property
+    def screening(self) -> bool:
+        return "screen" in self.tiers
+
+    def predict(
+        self,
+        X: Tensor = None,
+        features: Tensor = None,
+        no_speech_threshold: float = 0.6,
+        tier: str = "full",
+    ) -> str:
+        """Transcribe speech to text using audio samples or their precomputed log-mel features.
+        Features from a streaming builder only need their uncommitted tail decoded.
+        The screen tier, if enabled, decodes with the small model instead."""
+        tier = self.tiers.get(tier, self.tiers["full"])
+        if tier.name == "full":
+            if self.model is None:
+                self.reload()
+            self.touch()
+        # CPU time of this thread, the worker, other threads don't count.
+        cpu, wall = time.thread_time(), time.perf_counter()
+        if tier.model is not self.model:
+            mel = self.screen_mel(X, features, tier.model)
+            text = self.decode(mel, no_speech_threshold, model=tier.model)
+        else:
+            mel = features if features is not None else self.log_mel(X)
+            if self.stream is not None and features is not None:
+                text = self.stream.complete(mel, no_speech_threshold)
+            elif self.parallel is not None and mel.shape[-1] >= self.parallel.min_frames:
+                text = self.parallel.decode(mel, no_speech_threshold)
+            else:
+                text = self.decode(mel, no_speech_threshold)
+        wall = time.perf_counter() - wall
+        tier.calls += 1
+        tier.cpu_sec += time.thread_time() - cpu
+        tier.wall_sec += wall
+        seconds = mel.shape[-1] / FRAMES_PER_SECOND
+        log_json(
+            {
+                "transcribe": {
+                    "tier": tier.name,
+                    "profile": self.config.profile,
+                    "audio_sec": round(seconds, 3),
+                    "wall_sec": round(wall, 3),
+                    "rtf": round(wall / seconds, 3) if seconds else None,
+                },
+                **({"tiers": self.stats} if self.screening else {}),
+            }
         )
-        return y_pred["text"].strip()
+        return text
+
+    @property
+    def profile(self) -> DecodingProfile:
+        return self.config.decoding
+
+    def screen_mel(self, X: Tensor, features: Tensor, model: Whisper) -> Tensor:
+        """Capture features for the screening model, recomputed if its mel bins differ."""
+        if features is not None and features.shape[0] == model.dims.n_mels:
+            return features
+        return self.log_mel(X, model)
+
+    @property
+    def stats(self) -> list[dict]:
+        """Call count, CPU and wall time of each tier."""
+        return [tier.stats for tier in self.tiers.values()]
+
+    async def apredict(
+        self,
+        X: Tensor = None,
+        features: Tensor = None,
+        no_speech_threshold: float = 0.6,
+        tier: str = "full",
+    ) -> str:
+        """Run predict on the transcribe worker thread without blocking the event loop.
+        At most max_requests are queued, further requests wait for a free slot."""
+        async with self.requests:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, partial(self.predict, X, features, no_speech_threshold, tier)
+            )
+
+    def warmup(self, seconds: float = 1.0):
+        """Transcribe silence with each tier to initialize models and decoding state."""
+        for tier in self.tiers.values():
+            X = zeros(int(seconds * self.samplerate))
+            self.decode(self.log_mel(X, tier.model), model=tier.model)
+
+    def close(self):
+        if self.idle is not None:
+            self.idle.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.parallel is not None:
+            self.parallel.close()
+
+    def decode(
+        self,
+        mel: Tensor,
+        no_speech_threshold: float = 0.6,
+        prompt: list[int] = None,
+        silence: float = None,
+        model: Whisper = None,
+    ) -> str:
+        """Decode log-mel features the way whisper's transcribe does. Each 30 s window is decoded
+        with timestamps and the next one starts after its last complete segment, conditioned on
+        the text before it. Windows are padded with the spectrogram's silence level, as the pinned
+        whisper release does.
+        Prompt tokens, if given, follow the initial prompt. Uses the full model by default.
+        """
+        if model is None and self.model is None:
+            self.reload()
+        silence = float(mel.max()) - 2.0 if silence is None else silence
+        tokenizer = self.get_tokenizer(model)
+        tokens = self.prompt_tokens(model) + (prompt or [])
+        start, since, seek = len(tokens), 0, 0
+        while seek < mel.shape[-1]:
+            size = min(N_FRAMES, mel.shape[-1] - seek)
+            result = self.decode_with_fallback(
+                self.segment(mel[:, seek : seek + size], silence, model),
+                tokens[since:],
+                no_speech_threshold,
+                timestamps=True,
+                model=model,
+            )
+            if self.is_silence(result, no_speech_threshold):
+                seek += size
+                continue
+            complete, frames = self.seek(result.tokens, tokenizer.timestamp_begin, size)
+            seek += frames
+            tokens.extend(complete)
+            # Don't condition next windows on text decoded at high temperature.
+            if result.temperature > 0.5 or not self.profile.condition_on_previous_text:
+                since = len(tokens)
+        return tokenizer.decode(tokens[start:]).strip()
+
+    def seek(self, tokens: list[int], timestamp_begin: int, size: int) -> tuple[list[int], int]:
+        """Tokens of the window's complete segments and the frames to seek past them.
+        Same as whisper, the whole window if it ends with a single timestamp or has no
+        consecutive timestamps, otherwise up to the last one."""
+        stamps = [token >= timestamp_begin for token in tokens]
+        ends = [i for i in range(1, len(tokens)) if stamps[i - 1] and stamps[i]]
+        if not ends or stamps[-2:] == [False, True]:
+            return tokens, size
+        end = ends[-1]
+        # A segment ending at 0 would decode the same window again.
+        return tokens[:end], (tokens[end - 1] - timestamp_begin) * FRAMES_PER_TIMESTAMP or size
+
+    @property
+    def initial_prompt_tokens(self) -> list[int]:
+        return self.prompt_tokens()
+
+    def get_tokenizer(self, model: Whisper = None) -> Tokenizer:
+        """Tokenizer for the model's vocabulary."""
+        if model is None or model.is_multilingual == self.is_multilingual:
+            return self.tokenizer
+        return get_tokenizer(
+            model.is_multilingual, language=self.config.language, task="transcribe"
+        )
+
+    def prompt_tokens(self, model: Whisper = None) -> list[int]:
+        """Initial prompt tokens for the model's vocabulary."""
+        return self.get_tokenizer(model).encode(" " + self.config.initial_prompt.strip())
+
+    def segment(self, mel: Tensor, silence: float, model: Whisper = None) -> Tensor:
+        """Pad features to a 30 s window on the model's device."""
+        model = model or self.model
+        return pad(mel, (0, N_FRAMES - mel.shape[-1]), value=silence).to(model.device)
+
+    def is_silence(self, result: DecodingResult, no_speech_threshold: float) -> bool:
+        """Whisper's rule, likely no speech unless the average log probability is above
+        the threshold."""
+        logprob_threshold = self.profile.logprob_threshold
+        return result.no_speech_prob > no_speech_threshold and (
+            logprob_threshold is None or result.avg_logprob <= logprob_threshold
+        )
+
+    def needs_fallback(self, result: DecodingResult, no_speech_threshold: float) -> bool:
+        """Whisper's rule, too repetitive or unlikely, unless it is silence."""
+        profile = self.profile
+        failed = (
+            profile.compression_ratio_threshold is not None
+            and result.compression_ratio > profile.compression_ratio_threshold
+        ) or (
+            profile.logprob_threshold is not None
+            and result.avg_logprob < profile.logprob_threshold
+        )
+        silent = (
+            result.no_speech_prob > no_speech_threshold
+            and profile.logprob_threshold is not None
+            and result.avg_logprob < profile.logprob_threshold
+        )
+        return failed and not silent
+
+    def decode_with_fallback(
+        self,
+        segment: Tensor,
+        prompt: list[int],
+        no_speech_threshold: float = 0.6,
+        timestamps: bool = False,
+        model: Whisper = None,
+    ) -> DecodingResult:
+        """Decode window with the configured profile, retry at its higher temperatures
+        if the result is repetitive or unlikely."""
+        model, profile = model or self.model, self.profile
+        for temperature in profile.temperatures:
+            options = DecodingOptions(
+                language=self.config.language,
+                temperature=temperature,
+                sample_len=profile.sample_len,
+                beam_size=profile.beam_size if temperature == 0 else None,
+                best_of=profile.best_of if temperature > 0 else None,
+                prompt=prompt,
+                without_timestamps=not timestamps,
+                fp16=self.config.fp16 and model.device.type == "cuda",
+            )
+            with self.lock:
+                result = decode(model, segment, options)
+            if not self.needs_fallback(result, no_speech_threshold):
+                break
+        return result
@@ -0,0 +1,39 @@
+from torch import Tensor, hann_window, log10, exp, log, sign
+from torch.fft import rfft
+
+from app.system.config import VADConfig
+
+
+class VAD:
+    """Voice activity detection per frame from energy, zero crossing rate and spectral flatness.
+
+    A chunk is split into equal frames of about 20 ms and all features are computed
+    for every frame at once. A frame is voiced if it is loud enough, tonal (low spectral
+    flatness) and has a zero crossing rate below that of noise and clicks.
+    The energy threshold starts at energy_db and can be moved, e.g. to follow a noise floor.
+    """
+
+    def __init__(self, config: VADConfig, samplerate: int, chunk: int, frame_sec: float = 0.02):
+        self.config = config
+        self.energy_db = config.energy_db
+        self.n_frames = max(1, round(chunk / (samplerate * frame_sec)))
+        self.frame = chunk // self.n_frames
+        self.frame_sec = self.frame / samplerate
+        self.window = hann_window(self.frame)
+
+    def features(self, x: Tensor) -> tuple[Tensor, Tensor, Tensor]:
+        """Energy (dBFS), zero crossing rate and spectral flatness of every frame in x."""
+        X = x[: self.n_frames * self.frame].reshape(self.n_frames, self.frame)
+        energy = 10 * log10(X.square().mean(1) + 1e-10)
+        zcr = (sign(X).diff(dim=1) != 0).float().mean(1)
+        # Power spectrum without DC, flatness is geometric mean over arithmetic mean.
+        P = rfft(X * self.window).abs().square()[:, 1:] + 1e-10
+        flatness = exp(log(P).mean(1)) / P.mean(1)
+        return energy, zcr, flatness
+
+    def __call__(self, x: Tensor) -> Tensor:
+        """Boolean Tensor of voiced frames in chunk x."""
+        energy, zcr, flatness = self.features(x)
+        return (
+            (energy > self.energy_db) & (zcr < self.config.zcr) & (flatness < self.config.flatness)
+        )
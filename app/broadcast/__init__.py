@@ -1,4 +1,5 @@
 from rich.markdown import Markdown
+from rich.markup import escape
 from rich.console import Console
 from rich.syntax import Syntax
 from rich.status import Status
@@ -8,9 +9,10 @@ from rich.text import Text
 from rich import print
 
 from datetime import datetime
-from typing import Generator
+from typing import Generator, AsyncGenerator
 from re import findall, sub
 from time import sleep
+import asyncio
 
 from app.chat.context import Context
 from app.audio.capture import Capture
@@ -36,6 +38,7 @@ class Broadcast:
         self.default_lexer = "python"
         self.theme = "github-dark"
         self.console = Console()
+        self.partial_text = ""
 
     def load(self, context: Context) -> None:
         self.context = context
@@ -53,17 +56,46 @@ class Broadcast:
 
     def clear(self):
         """Clear line text."""
+        self.partial_text = ""
         print(f"{' ' * self.width}", end="\r")
 
-    def mon(self, peak: float, rms: float, time: float, gate: bool):
-        """Broadcast audio monitoring information."""
+    def mon(
+        self,
+        peak: float,
+        rms: float,
+        time: float,
+        gate: bool,
+        overflows: int = 0,
+        drops: int = 0,
+        rejected: int = 0,
+        floor: float = None,
+    ):
+        """Broadcast audio monitoring information.
+        Input overflows, dropped chunks and captures rejected by vad if any,
+        and the noise floor if adaptive."""
+        counters = f"{overflows} xrun {drops} drop " if overflows or drops else ""
+        counters += f"{rejected} rej " if rejected else ""
+        counters += f"{floor:.0f} floor " if floor is not None else ""
+        status = f" {(peak):.0f} db {(rms):.0f} rms {time:.0f} s {counters}"
         print(
-            f" {(peak):.0f} db {(rms):.0f} rms {time:.0f} s "
+            status
             # f" :studio_microphone: {(peak):.0f} db {(rms):.0f} rms {time:.0f} s "
-            f"[bold red]{'*'*gate}[/bold red]{' '*5}",
+            + f"[bold red]{'*'*gate}[/bold red] {self.partial_line(len(status) + gate + 1)}"
+            + f"{' '*5}",
             end="\r",
         )
 
+    def partial(self, text: str):
+        """Broadcast partial transcription of the capture in progress on the monitor line."""
+        self.partial_text = text
+        print(f" {self.partial_line(0)}{' '*5}", end="\r")
+
+    def partial_line(self, offset: int):
+        """Latest partial text that fits in the rest of the line."""
+        width = self.width - offset - 6
+        text = self.partial_text.replace("\n", " ")
+        return f"[dim]{escape(text[-width:]) if width > 0 else ''}[/dim]"
+
     def loading(self, text: str):
         """Generator for displaying loading spinner."""
         loading = Status(text)
@@ -114,28 +146,43 @@ class Broadcast:
 
     def assistant(self, stream: Generator[str, None, None]):
         """Broadcast assistant response. Yields before broadcasting."""
-        LEXER_MATCH = r"```(.+?)\n"
-        LEXER_REPLACE = r"```.*?\n"
-        THEME = self.theme
-        lexer = [self.default_lexer]
-        # header
-        print(f":nerd_face: [bold green]{self.context.assistant.name}[/bold green]")
-        # text
+        lexer = self.assistant_header()
         for block in stream:
             # print code without yielding it
-            if "```" in block:
-                # detect code language and print line by line
-                lexer = findall(LEXER_MATCH, block) or lexer
-                for t in sub(LEXER_REPLACE, " \n", block).split("\n")[:-1]:
-                    print(
-                        Syntax(t, lexer=lexer[0], theme=THEME),
-                        end="",
-                    )
-                    sleep(0.5)
-                print("")
-                continue
-            yield block
-            for t in Text(block, justify="full"):
+            if "```" not in block:
+                yield block
+            for t, delay in self.assistant_block(block, lexer):
                 print(t, end="")
-                sleep(0.05)
+                sleep(delay)
         print("\n")
+
+    async def aassistant(self, stream: AsyncGenerator[str, None]):
+        """Same as assistant for an async stream, printing doesn't block the event loop."""
+        lexer = self.assistant_header()
+        async for block in stream:
+            if "```" not in block:
+                yield block
+            for t, delay in self.assistant_block(block, lexer):
+                print(t, end="")
+                await asyncio.sleep(delay)
+        print("\n")
+
+    def assistant_header(self) -> list[str]:
+        """Print header and return lexer state for the response's code blocks."""
+        print(f":nerd_face: [bold green]{self.context.assistant.name}[/bold green]")
+        return [self.default_lexer]
+
+    def assistant_block(self, block: str, lexer: list[str]):
+        """Printable pieces of block with their delay. Code is printed line by line in the
+        language detected in its fence, or the last one detected."""
+        LEXER_MATCH = r"```(.+?)\n"
+        LEXER_REPLACE = r"```.*?\n"
+        if "```" in block:
+            # detect code language and print line by line
+            lexer[:] = findall(LEXER_MATCH, block) or lexer
+            for t in sub(LEXER_REPLACE, " \n", block).split("\n")[:-1]:
+                yield Syntax(t, lexer=lexer[0], theme=self.theme), 0.5
+            yield "\n", 0
+            return
+        for t in Text(block, justify="full"):
+            yield t, 0.05
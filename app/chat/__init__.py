@@ -4,14 +4,29 @@ https://github.com/openai/openai-cookbook/blob/main/examples/How_to_stream_compl
 from app.chat.message import Message, Interaction, ROLES
 from app.system.config import ChatConfig
 from app.chat.streamer import Streamer
+from app.chat.memory import ShortTerm
 from app.system.logger import log_json
 from app.chat.context import Context
 
 from tiktoken import encoding_for_model
+from typing import NamedTuple
+from time import perf_counter
+import asyncio
 
 __all__ = ["Chat"]
 
 
+class Prompt(NamedTuple):
+    """Context derived request parts, valid while the context digest is the same."""
+
+    digest: str
+    system: str
+    system_tokens: int
+    header: str
+    header_tokens: int
+    logit_bias: dict[int, int]
+
+
 class Chat:
     """Chat completion flow."""
 
@@ -25,12 +40,17 @@ class Chat:
     ):
         self.config = config
         self.context = context
-        self.streamer = Streamer()
         self.encoder = encoding_for_model(self.config.model)
+        self.streamer = Streamer(self.encoder)
         # memory
         self.short_term = None
         self.long_term = []
+        self.memory = ShortTerm(config.max_total_tokens - config.max_completion_tokens)
         self.status_ok = None
+        self._prompt: Prompt = None
+        # latency
+        self.started_at = 0.0
+        self.first_block_sec = None
 
     def start(self, user_message: Message):
         """Compose a request using short term and long term messages according to set config/context.
@@ -45,31 +65,96 @@ class Chat:
         # get updated short term memory for request
         messages = self.get_short_term_messages(user_message)
         self.status_ok = False
-        request = {
-            "messages": [m.to_api() for m in messages],
-            "model": self.config.model,
-            "max_tokens": self.config.max_completion_tokens,
-            "temperature": self.config.temperature,
-            "logit_bias": {
-                token: weight
-                for text, weight in self.context.assistant.logit_bias.items()
-                for token in self.encoder.encode(text)
-            },
-            "stream": True,
-        }
+        request = self.request(messages)
         try:
             # stream response blocks
             blocks = []
-            n_tokens = 0
-            for block, size in self.streamer.request(request, min_block_size=40):
+            for block, _ in self.streamer.request(request, **self.block_policy):
+                self.first_block(blocks)
                 yield block
-                n_tokens += size
                 blocks.append(block)
         except BaseException as e:
             # Log failed completion and return.
             return log_json({"status": "error", "request": request, "exception": str(e)})
-        # Add assistant message.
-        messages.append(self.assistant_message("".join(blocks), n_tokens))
+        self.complete(messages, blocks)
+
+    async def astart(self, user_message: Message):
+        """Async version of start on the async OpenAI client.
+
+        Closing the generator or cancelling the task iterating it closes the completion
+        stream, the interaction is then not added to memory and status_ok stays False.
+        """
+        messages = self.get_short_term_messages(user_message)
+        self.status_ok = False
+        request = self.request(messages)
+        blocks = []
+        try:
+            async for block, _ in self.streamer.arequest(request, **self.block_policy):
+                self.first_block(blocks)
+                yield block
+                blocks.append(block)
+        except (asyncio.CancelledError, GeneratorExit):
+            log_json({"status": "cancelled", "request": request, "content": "".join(blocks)})
+            raise
+        except Exception as e:
+            log_json({"status": "error", "request": request, "exception": str(e)})
+            return
+        self.complete(messages, blocks)
+
+    @property
+    def block_policy(self) -> dict:
+        """Small first block for a quick start of speech, then geometrically larger ones."""
+        return {
+            "min_block_size": self.config.max_block_tokens,
+            "first_block_size": self.config.first_block_tokens,
+            "growth": self.config.block_growth,
+        }
+
+    def first_block(self, blocks: list[str]):
+        """Record time to first block since the request started."""
+        if not blocks:
+            self.first_block_sec = perf_counter() - self.started_at
+
+    def request(self, messages: list[Message]) -> dict:
+        """Chat completion stream request for messages, starts the latency clock."""
+        self.started_at = perf_counter()
+        self.first_block_sec = None
+        return {
+            "messages": [m.to_api() for m in messages],
+            "model": self.config.model,
+            "max_tokens": self.config.max_completion_tokens,
+            "temperature": self.config.temperature,
+            "logit_bias": self.prompt.logit_bias,
+            "stream": True,
+        }
+
+    @property
+    def prompt(self) -> Prompt:
+        """Encoded system message, header and logit bias, rebuilt when the context changes."""
+        if self._prompt is None or self._prompt.digest != self.context.digest:
+            system = self.context.system.message
+            header = self.context.system.context_header
+            self._prompt = Prompt(
+                digest=self.context.digest,
+                system=system,
+                system_tokens=len(self.encoder.encode(system)),
+                header=header,
+                header_tokens=len(self.encoder.encode(header)),
+                logit_bias={
+                    token: weight
+                    for text, weight in self.context.assistant.logit_bias.items()
+                    for token in self.encoder.encode(text)
+                },
+            )
+        return self._prompt
+
+    def complete(self, messages: list[Message], blocks: list[str]):
+        """Add assistant message made of the streamed blocks and store messages in memory.
+        Its token count is encoded from the whole content, deltas can hold several tokens."""
+        messages.append(self.assistant_message("".join(blocks)))
+        if self.short_term is None:
+            self.memory.clear()
+        self.memory.append(*messages[-2:])
         # Note, the system message with long term memory content is included.
         self.short_term = Interaction.new(messages)
         self.status_ok = True
@@ -86,20 +171,9 @@ class Chat:
         )
         if not self.short_term:
             return [system_message, user_message]
-        # Get short term memory as (user, assistant) with latest pairs first. Exclude system message (index 0).
-        token_limit = self.config.max_total_tokens
-        data = self.short_term.messages
-        messages = []
-        for user, assistant in zip(reversed(data[1::2]), reversed(data[2::2])):
-            tokens = assistant.n_tokens + user.n_tokens
-            if (n_tokens + tokens) > token_limit:
-                break
-            n_tokens += tokens
-            # Append in reverse order.
-            messages.append(assistant)
-            messages.append(user)
-        # Reverse messages so oldest pair goes first.
-        return [system_message, *reversed(messages), user_message]
+        # Newest (user, assistant) pairs that fit the remaining tokens, oldest pair first.
+        messages = self.memory.select(self.config.max_total_tokens - n_tokens)
+        return [system_message, *messages, user_message]
 
     def compose_system_context(self):
         """Compose context content from long term memory messages.
@@ -125,12 +199,12 @@ class Chat:
 
     def system_message(self, with_long_term: bool = True):
         """Create a Message with the System data and long term memory if any."""
-        content = self.context.system.message
-        n_tokens = len(self.encoder.encode(content))
+        prompt = self.prompt
+        content, n_tokens = prompt.system, prompt.system_tokens
         # If long term is available, add it to system context alongside header.
         if with_long_term and self.long_term:
-            header = self.context.system.context_header
-            n_tokens += len(self.encoder.encode(header))
+            header = prompt.header
+            n_tokens += prompt.header_tokens
             tokens, context = self.compose_system_context()
             content += f" {header}\n\n{context}" if context else ""
             n_tokens += tokens
@@ -2,6 +2,8 @@
 Chat Context
 """
 from pydantic import BaseModel, Field
+from hashlib import md5
+import json
 import yaml
 
 
@@ -44,24 +46,33 @@ class Context(BaseModel):
     assistant_: AssistantContext = Field(alias="assistant")
     system_: SystemContext = Field(alias="system")
     context_file: str = ""
+    digest: str = ""
 
     @classmethod
     def from_yaml(cls, filename: str):
-        """Load context from YAML file."""
+        """Load context from YAML file. Digest is the md5 of its content."""
         with open(filename, "rb") as f:
-            c = Context(**yaml.safe_load(f))
+            data = yaml.safe_load(f)
+        c = Context(**data)
         c.context_file = filename
+        # YAML dates and timestamps are hashed as their string form.
+        c.digest = md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
         return c
 
-    def update(self):
-        """Reload YAML file from"""
+    def update(self) -> bool:
+        """Reload YAML file from context_file. Returns True if its content changed."""
         try:
             c = Context.from_yaml(self.context_file)
-            self.user_ = c.user_
-            self.assistant_ = c.assistant_
-            self.system_ = c.system_
         except BaseException as e:
             print(e)
+            return False
+        if c.digest == self.digest:
+            return False
+        self.user_ = c.user_
+        self.assistant_ = c.assistant_
+        self.system_ = c.system_
+        self.digest = c.digest
+        return True
 
     @property
     def system(self):
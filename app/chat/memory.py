@@ -0,0 +1,47 @@
+"""
+Short term memory with running token totals.
+"""
+from collections import deque
+from bisect import bisect_left
+from itertools import islice
+
+from app.chat.message import Message
+
+
+class ShortTerm:
+    """(user, assistant) message pairs, oldest first, and the token total before each pair.
+
+    Totals only grow, so appending a pair is O(1) and the newest pairs that fit a budget are
+    found with a binary search over them. Pairs that no longer fit max_tokens on their own
+    are dropped from the left.
+    """
+
+    def __init__(self, max_tokens: int) -> None:
+        self.max_tokens = max_tokens
+        self.clear()
+
+    def clear(self):
+        self.pairs: deque[tuple[Message, Message]] = deque()
+        self.starts: deque[int] = deque()
+        self.total = 0
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @property
+    def n_tokens(self) -> int:
+        return self.total - self.starts[0] if self.pairs else 0
+
+    def append(self, user: Message, assistant: Message):
+        self.pairs.append((user, assistant))
+        self.starts.append(self.total)
+        self.total += user.n_tokens + assistant.n_tokens
+        while self.pairs and self.n_tokens > self.max_tokens:
+            self.pairs.popleft()
+            self.starts.popleft()
+
+    def select(self, budget: int) -> list[Message]:
+        """Messages of the newest pairs within budget tokens, oldest pair first."""
+        n = len(self.pairs) - bisect_left(self.starts, self.total - budget)
+        pairs = list(islice(reversed(self.pairs), n))
+        return [m for pair in reversed(pairs) for m in pair]
@@ -1,75 +1,247 @@
 from openai import ChatCompletion
-from typing import Generator
+from tiktoken import Encoding
+from typing import Generator, AsyncGenerator, TypeVar
+import asyncio
 import re
 
+T = TypeVar("T")
+
+
+class Lines:
+    """Accumulates streamed text into lines ending in a blank line or a sentence end.
+
+    Text is kept as a list of parts and every delta is scanned once: the break search
+    only looks at the delta and the two characters before it, and code fences are counted
+    from runs of backticks, carrying a run that is split across deltas.
+    Lines end right after their break, even if the delta continues. A period after a digit
+    (list items, numbers) or inside a code span or block is not a sentence end.
+    Token counts come from the encoder, if given, instead of the number of deltas.
+    """
+
+    BREAK = re.compile(r"\n\n|[.!?] ")
+    BACKTICKS = re.compile("`+")
+
+    def __init__(self, encoder: Encoding = None) -> None:
+        self.encoder = encoder
+        # Backtick run that opened the current code span or block, 0 outside code.
+        self.code = 0
+        self.reset()
+
+    def reset(self):
+        self.parts: list[str] = []
+        self.last = ""
+        self.run = 0
+        self.fences = 0
+        self.deltas = 0
+
+    def __bool__(self):
+        return bool(self.parts)
+
+    def feed(self, text: str) -> list[tuple[str, int, int]]:
+        """Add delta text, returns the lines it completes. Text after a break
+        starts the next line."""
+        if "\n" not in text and " " not in text:
+            self.scan(text)
+            return []
+        lines, scanned, new = [], 0, True
+        before, offset = self.last + text, len(self.last)
+        for match in self.BREAK.finditer(before):
+            end = match.end() - offset
+            if end <= scanned:
+                continue
+            self.scan(text[scanned:end], new)
+            scanned, new = end, False
+            if match.group() == "\n\n" or not self.within(before, match.start()):
+                lines.append(self.take())
+                new = True
+        if text[scanned:]:
+            self.scan(text[scanned:], new)
+        return lines
+
+    def within(self, text: str, i: int) -> bool:
+        """Punctuation at i is part of a number or of code."""
+        return self.code > 0 or (text[i] == "." and text[i - 1 : i].isdigit())
+
+    def scan(self, text: str, new: bool = True):
+        self.parts.append(text)
+        self.deltas += new
+        self.last = (self.last + text)[-2:]
+        if not self.run and "`" not in text:
+            return
+        # Backtick runs, the last one may continue in the next delta.
+        runs = [len(m.group()) for m in self.BACKTICKS.finditer("`" * self.run + text)]
+        self.run = runs.pop() if text.endswith("`") else 0
+        self.fences += sum(n // 3 for n in runs)
+        self.close(runs)
+
+    def close(self, runs: list[int]):
+        """Open or close code with complete backtick runs, a span ends on a run of its length."""
+        for n in runs:
+            if not self.code:
+                self.code = n
+            elif n == self.code:
+                self.code = 0
+
+    def take(self) -> tuple[str, int, int]:
+        """Current line, its token count and number of code fences, starts a new one."""
+        self.fences += self.run // 3
+        self.close([self.run] if self.run else [])
+        line = "".join(self.parts)
+        count = len(self.encoder.encode(line)) if self.encoder is not None else self.deltas
+        fences = self.fences
+        self.reset()
+        return line, count, fences
+
+
+class Blocks:
+    """Groups streamed lines into blocks of text or code.
+
+    Text lines are grouped until the block reaches its target size, code blocks are kept
+    whole from their opening to their closing fence. push returns the blocks a line completes,
+    empty blocks are skipped.
+
+    The first target is first_block_size tokens, so speech can start at the first sentence.
+    Each text block multiplies the target by growth, up to min_block_size.
+    """
+
+    def __init__(
+        self, min_block_size: int = 40, first_block_size: int = None, growth: float = 1.0
+    ) -> None:
+        self.min_block_size = min_block_size
+        self.target = min(first_block_size or min_block_size, min_block_size)
+        self.growth = growth
+        self.is_code = False
+        self.block: list[str] = []
+        self.size = 0
+
+    def take(self) -> list[tuple[str, int]]:
+        """Current block and its token count if not empty, starts a new one."""
+        block = [("".join(self.block), self.size)] if self.block else []
+        self.block, self.size = [], 0
+        return block
+
+    def push(self, line: str, count: int, fences: int) -> list[tuple[str, int]]:
+        blocks = []
+        # detect code blocks
+        if fences:
+            if fences % 2 == 0:
+                # if it is a one-line code, yield text, and then code
+                return [*self.take(), (line, count)]
+            self.is_code = not self.is_code
+            if self.is_code:
+                # if it is a code block, yield the previous block
+                blocks.extend(self.take())
+                self.block, self.size = [line], count
+            else:
+                # if it is the end of a code block, write, then yield the block
+                self.block.append(line)
+                self.size += count
+                blocks.extend(self.take())
+        else:
+            self.block.append(line)
+            self.size += count
+        # yields block if it has enough tokens or keys are empty
+        if self.size >= self.target and not self.is_code:
+            blocks.extend(self.take())
+            self.target = min(self.target * self.growth, self.min_block_size)
+        return blocks
+
+    def flush(self) -> list[tuple[str, int]]:
+        """The rest, if any."""
+        return self.take()
+
 
 class Streamer:
     """Chat completion stream"""
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, encoder: Encoding = None) -> None:
+        """Encoder counts tokens of streamed lines, otherwise every delta counts as one."""
+        self.encoder = encoder
 
     def reader(
         self, generator: Generator[dict, None, None]
-    ) -> Generator[tuple[str, int], None, None]:
+    ) -> Generator[tuple[str, int, int], None, None]:
         """
         Reads tokens in a sequence until it finds a new line, then
-        yields the line with the token count.
+        yields the line with the token count and number of code fences.
         """
-        NEW_LINE = "\n\n"
-        line = ""
-        token = ""
-        token_count = 0
+        lines = Lines(self.encoder)
         for event in generator:
             delta = event["choices"][0]["delta"]
             if "content" in delta:
-                token = delta["content"]
-                line += token
-                token_count += 1
-            if not delta or NEW_LINE in line:
-                yield line, token_count
-                line = ""
-                token_count = 0
-
-    def request(self, request: dict, min_block_size=40):
+                for line in lines.feed(delta["content"]):
+                    yield line
+            elif not delta and lines:
+                yield lines.take()
+        if lines:
+            yield lines.take()
+
+    async def areader(
+        self, generator: AsyncGenerator[dict, None]
+    ) -> AsyncGenerator[tuple[str, int, int], None]:
+        """Same as reader for an async stream of events."""
+        lines = Lines(self.encoder)
+        async for event in generator:
+            delta = event["choices"][0]["delta"]
+            if "content" in delta:
+                for line in lines.feed(delta["content"]):
+                    yield line
+            elif not delta and lines:
+                yield lines.take()
+        if lines:
+            yield lines.take()
+
+    def request(self, request: dict, min_block_size=40, **policy):
         """Request Completion stream and return blocks of text or code.
+        Policy is first_block_size and growth, see Blocks.
         https://platform.openai.com/docs/api-reference/chat/create
         """
-        NEW_CODE = "```"
-        current_block_is_code = False
-        block_size = 0
-        block = []
-        # flow
-        for line, count in self.reader(ChatCompletion.create(**request)):
-            # detect code blocks
-            if NEW_CODE in line:
-                if len(re.findall(NEW_CODE, line)) == 2:
-                    # if it is a one-line code, yield text, and then code
-                    yield "".join(block), block_size
-                    yield line, count
-                    block = []
-                    block_size = 0
-                    continue
-                current_block_is_code = not current_block_is_code
-                if current_block_is_code:
-                    # if it is a code block, yield the previous block
-                    yield "".join(block), block_size
-                    block = [line]
-                    block_size = count
-                else:
-                    # if it is the end of a code block, write, then yield the block
-                    block.append(line)
-                    yield "".join(block), block_size
-                    block = []
-                    block_size = 0
-            else:
-                block.append(line)
-                block_size += count
-            # yields block if it has enough tokens or keys are empty
-            if block_size >= min_block_size and not current_block_is_code:
-                yield "".join(block), block_size
-                block = []
-                block_size = 0
-        # yield the rest
-        if block_size > 0:
-            yield "".join(block), block_size
+        return self.blocks(ChatCompletion.create(**request), min_block_size, **policy)
+
+    def blocks(self, generator: Generator[dict, None, None], min_block_size=40, **policy):
+        """Blocks of text or code from a stream of completion events."""
+        blocks = Blocks(min_block_size, **policy)
+        for line in self.reader(generator):
+            yield from blocks.push(*line)
+        yield from blocks.flush()
+
+    async def arequest(self, request: dict, min_block_size=40, **policy):
+        """Async request, same blocks as request. Closing or cancelling the generator
+        closes the completion stream."""
+        blocks = Blocks(min_block_size, **policy)
+        response = await ChatCompletion.acreate(**request)
+        try:
+            async for line in self.areader(response):
+                for block in blocks.push(*line):
+                    yield block
+            for block in blocks.flush():
+                yield block
+        finally:
+            await response.aclose()
+
+
+async def prefetch(source: AsyncGenerator[T, None], size: int = 16) -> AsyncGenerator[T, None]:
+    """Iterate source on its own task, up to size items ahead of the consumer.
+    The source keeps streaming while the consumer awaits other work. Closing this
+    generator cancels the task and closes the source."""
+    queue = asyncio.Queue(size)
+    end = object()
+
+    async def pull():
+        try:
+            async for item in source:
+                await queue.put((item, None))
+            await queue.put((end, None))
+        except Exception as e:
+            await queue.put((end, e))
+        finally:
+            await source.aclose()
+
+    task = asyncio.create_task(pull())
+    try:
+        while (item := await queue.get())[0] is not end:
+            yield item[0]
+        if item[1] is not None:
+            raise item[1]
+    finally:
+        task.cancel()
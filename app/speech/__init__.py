@@ -1,9 +1,14 @@
-from tempfile import TemporaryFile
-from typing import BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator
+from functools import partial
 from boto3 import client
+import asyncio
 
-from app.speech.polly import PollyClient
+from app.speech.cache import SpeechCache
+from app.speech.polly import PollyClient, StreamingBody
+from app.speech.stream import SpeechStream
 from app.speech.voice import VoiceStyle
+from app.system.config import SpeechConfig
 from app.system.logger import log_json
 
 
@@ -13,6 +18,7 @@ class Speech:
         voice: VoiceStyle,
         samplerate: int,
         polly: PollyClient = None,
+        config: SpeechConfig = None,
     ) -> None:
         """Setup client and config for speech synthesis.
 
@@ -20,13 +26,67 @@ class Speech:
             voice (VoiceStyle): Voice style.
             sr (int): Sample Rate.
             polly (PollyClient, optional): AWS SDK Client. Defaults to None.
+            config (SpeechConfig, optional): Synthesis pipeline config. Defaults to None.
         """
         self.voice = voice
         self.samplerate = samplerate
         self.client = polly if polly else client("polly")
+        self.config = config or SpeechConfig()
+        self.cache = (
+            SpeechCache(self.config.cache.directory, self.config.cache.max_mb)
+            if self.config.cache.enabled
+            else None
+        )
+        # boto3 clients are thread safe, requests run on the pool
+        self.executor = ThreadPoolExecutor(self.config.max_requests)
 
-    def synthesize(self, text: str, use_ssml: bool = True, as_file: bool = True) -> BinaryIO:
-        """AWS Polly Voice Synthesis with SSML. Store to temp file if as_file, else AudioStream from response.
+    async def asynthesize(
+        self, blocks: AsyncGenerator[str, None]
+    ) -> AsyncGenerator[SpeechStream, None]:
+        """Synthesize blocks on the thread pool as they arrive, yield their streams in order.
+
+        Up to max_requests blocks are submitted and not yet yielded, so the next ones are
+        synthesized while the consumer plays the current one. Empty blocks are skipped.
+        Closing this generator or cancelling its task closes blocks and cancels requests
+        that have not started, those running are discarded.
+        """
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.config.max_requests)
+        futures: asyncio.Queue[asyncio.Future] = asyncio.Queue()
+
+        async def submit():
+            try:
+                async for block in blocks:
+                    await slots.acquire()
+                    futures.put_nowait(loop.run_in_executor(self.executor, self.synthesize, block))
+            finally:
+                futures.put_nowait(None)
+                await blocks.aclose()
+
+        task = asyncio.create_task(submit())
+        try:
+            while (future := await futures.get()) is not None:
+                stream = await future
+                slots.release()
+                if stream is not None:
+                    yield stream
+            # raise the exception of blocks, if any
+            await task
+        finally:
+            task.cancel()
+            while not futures.empty():
+                if (future := futures.get_nowait()) is not None:
+                    future.cancel()
+
+    def close(self):
+        """Cancel queued requests."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def synthesize(
+        self, text: str, use_ssml: bool = True, as_stream: bool = True
+    ) -> SpeechStream | StreamingBody:
+        """AWS Polly Voice Synthesis with SSML. SpeechStream reading the response if as_stream,
+        else AudioStream from response. Streams are read from and added to the cache, if enabled.
         https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/polly/client/synthesize_speech.html
         """
         text = self.sanitize(text)
@@ -42,13 +102,16 @@ class Speech:
                 "OutputFormat": "ogg_vorbis",
                 "Engine": self.voice.engine,
             }
+            data = self.cache.get(request) if as_stream and self.cache else None
+            if data is not None:
+                return SpeechStream(data=data)
             response = self.client.synthesize_speech(**request)
-            if as_file:
-                file = TemporaryFile("w+b")
-                file.write(response["AudioStream"].read())
-                file.seek(0)
-                return file
-            return response["AudioStream"]
+            if not as_stream:
+                return response["AudioStream"]
+            return SpeechStream(
+                response["AudioStream"],
+                on_complete=partial(self.cache.put, request) if self.cache else None,
+            )
         except BaseException as e:
             log_json({"request": request, "exception": str(e)})
 
@@ -0,0 +1,113 @@
+"""
+Synthesized speech cache on disk.
+"""
+from threading import Lock, get_ident
+from hashlib import sha256
+from pathlib import Path
+import json
+import time
+import os
+
+from app.system.logger import log_json
+
+# Temporary files older than this were left by a write that didn't finish.
+STALE_SEC = 60.0
+
+
+def cache_dir() -> Path:
+    """Default directory, under the user's cache."""
+    default = Path.home() / ".cache"
+    return Path(os.getenv("XDG_CACHE_HOME", default)) / "va-gpt" / "speech"
+
+
+class SpeechCache:
+    """Audio bytes keyed by the sha256 of their synthesis request, so rendered SSML, voice,
+    engine, language, samplerate and format all take part in the key.
+
+    Files are written to a temporary name and renamed, so processes sharing the directory
+    never read partial audio. Reads touch the file's mtime and eviction removes the least
+    recently used files once the directory is over max_mb, and stale temporary files.
+    A file removed by another process is a miss, a failed write is logged and skipped.
+    """
+
+    def __init__(self, directory: Path = None, max_mb: float = 64.0) -> None:
+        self.directory = cache_dir() if directory is None else Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_mb * 2**20)
+        self.size = self.evict()
+        # stats, updated from synthesis threads
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def path(self, request: dict) -> Path:
+        key = sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+        return self.directory / f"{key}.ogg"
+
+    def get(self, request: dict) -> bytes | None:
+        """Cached audio for request, None on a miss."""
+        path = self.path(request)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += len(data)
+        return data
+
+    def put(self, request: dict, data: bytes):
+        path = self.path(request)
+        tmp = path.with_suffix(f".{os.getpid()}.{get_ident()}.tmp")
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            tmp.unlink(missing_ok=True)
+            return log_json({"error": f"Could not write speech cache: {e}"})
+        with self.lock:
+            self.size += len(data)
+            if self.size <= self.max_bytes:
+                return
+        size = self.evict()
+        with self.lock:
+            self.size = size
+
+    def evict(self) -> int:
+        """Remove least recently used files until under max_bytes, returns the size left.
+        Stale temporary files are removed, those being written aren't counted."""
+        files, now = [], time.time()
+        for entry in os.scandir(self.directory):
+            tmp = entry.name.endswith(".tmp")
+            if not tmp and not entry.name.endswith(".ogg"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if tmp:
+                if now - stat.st_mtime > STALE_SEC:
+                    Path(entry.path).unlink(missing_ok=True)
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file[1] for file in files)
+        for _, n, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            size -= n
+        return size
+
+    @property
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else None,
+            "bytes_saved": self.bytes_saved,
+        }
@@ -0,0 +1,73 @@
+"""
+Synthesized audio streamed from the response body.
+"""
+from threading import Condition, Thread
+from typing import Callable, Iterator
+
+from app.speech.polly import StreamingBody
+from app.system.logger import log_json
+
+
+class SpeechStream:
+    """Audio of a synthesis response, read from its body on a thread as it arrives.
+
+    Chunks are kept, so any number of readers can iterate them from the start, each one
+    waiting for the next chunk. Playback can begin on the first chunk while the rest
+    downloads, and read returns the whole audio once complete, for the recorder tape.
+    on_complete is called with the whole audio if the body was read without errors.
+    """
+
+    def __init__(
+        self,
+        body: StreamingBody = None,
+        data: bytes = None,
+        chunk_size: int = 4096,
+        on_complete: Callable[[bytes], None] = None,
+    ) -> None:
+        self.chunks: list[bytes] = [data] if data else []
+        self.condition = Condition()
+        self.done = body is None
+        self.closed = False
+        if body is not None:
+            Thread(target=self.fill, args=(body, chunk_size, on_complete), daemon=True).start()
+
+    def fill(self, body: StreamingBody, chunk_size: int, on_complete: Callable[[bytes], None]):
+        """Read body into chunks until it ends or the stream is closed."""
+        try:
+            while not self.closed and (chunk := body.read(chunk_size)):
+                with self.condition:
+                    if self.closed:
+                        break
+                    self.chunks.append(chunk)
+                    self.condition.notify_all()
+        except BaseException as e:
+            log_json({"error": f"Could not read speech stream: {e}"})
+            self.closed = True
+        finally:
+            body.close()
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+        if on_complete is not None and not self.closed:
+            on_complete(self.read())
+
+    def __iter__(self) -> Iterator[bytes]:
+        i = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: i < len(self.chunks) or self.done)
+                if i == len(self.chunks):
+                    return
+                chunk = self.chunks[i]
+            i += 1
+            yield chunk
+
+    def read(self) -> bytes:
+        """Whole audio, waits for the body to end."""
+        return b"".join(self)
+
+    def close(self):
+        """Stop reading the body, readers get what arrived so far without waiting for it."""
+        with self.condition:
+            self.closed = self.done = True
+            self.condition.notify_all()
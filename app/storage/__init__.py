@@ -1,4 +1,6 @@
+from time import perf_counter
 from pathlib import Path
+import asyncio
 
 from app.storage.database import Database
 from app.storage.embedder import Embedder
@@ -6,6 +8,7 @@ from app.storage.reaper import Reaper
 
 from app.chat.message import Message, Interaction
 from app.system.config import StorageConfig
+from app.system.logger import log_json
 from app.audio import Capture, Recorder
 
 
@@ -24,8 +27,11 @@ class Storage:
         self.record_audio = config.files.record_audio
         self.files = config.files
         # secondary data
-        self.embedding_cache = None
         self.audiofiles_cache = None
+        # late similar messages, only the last lookup that missed its budget fills the cache
+        self.similar_cache: list[Interaction] = None
+        self.similar_late: asyncio.Task = None
+        self.retrieval = {"calls": 0, "misses": 0}
 
     @property
     def directory(self) -> Path:
@@ -36,11 +42,14 @@ class Storage:
             path.mkdir(parents=True)
         return path
 
-    async def read_similar(self, message: Message, exclude: Interaction = None):
+    async def read_similar(
+        self, message: Message, exclude: Interaction = None
+    ) -> tuple[list[Interaction], tuple[str, list[float]] | None]:
         """Look for similar message in database.
         If message is not found, generate new embeddings and use them to find similar message.
-        Return similar message.
+        Return similar messages and the new (message id, embedding), if any, for store_interaction.
         """
+        embedding = None
         exclude_ids = [m.id for m in exclude.messages] if exclude else []
         async with self.db.session() as session:
             result = await self.db.read_similar_messages(
@@ -48,23 +57,79 @@ class Storage:
             )
             # if message is not found, generate new embeddings
             if not result:
-                embedding = await self.embedder.get(message.content)
-                self.embedding_cache = (message.id, embedding)
+                vector = await self.embedder.get(message.content)
+                embedding = (message.id, vector)
                 result = await self.db.read_similar_messages(
-                    session, message.id, embedding=embedding, exclude_ids=exclude_ids
+                    session, message.id, embedding=vector, exclude_ids=exclude_ids
                 )
         # parse database results
-        return [Interaction.from_db(r) for r in result]
+        return [Interaction.from_db(r) for r in result], embedding
 
-    async def store_interaction(self, interaction: Interaction):
-        """Store messages in database."""
+    async def read_similar_within(
+        self, message: Message, exclude: Interaction = None, budget_sec: float = 1.0
+    ) -> tuple[list[Interaction], tuple[str, list[float]] | None]:
+        """Same as read_similar, but waits at most budget_sec.
+        On a miss the lookup keeps running and its result is cached, the next miss returns it
+        instead of nothing, so a slow database still feeds long term memory one turn later.
+        A miss has no embedding yet, store_interaction waits for it. A hit discards the cached
+        result.
+        """
+        task = asyncio.ensure_future(self.read_similar(message, exclude))
+        start = perf_counter()
+        self.retrieval["calls"] += 1
+        try:
+            result, embedding = await asyncio.wait_for(asyncio.shield(task), budget_sec)
+            self.similar_cache = self.similar_late = None
+            missed = False
+        except asyncio.TimeoutError:
+            self.similar_late = task
+            task.add_done_callback(self.cache_similar)
+            result, embedding, self.similar_cache = self.similar_cache or [], None, None
+            self.retrieval["misses"] += 1
+            missed = True
+        log_json(
+            {
+                "retrieval": {
+                    "sec": perf_counter() - start,
+                    "budget_sec": budget_sec,
+                    "missed": missed,
+                    "interactions": len(result),
+                    **self.retrieval,
+                }
+            }
+        )
+        return result, embedding
+
+    def cache_similar(self, task: asyncio.Task):
+        """Keep the result of the last lookup that missed its budget."""
+        if task.cancelled() or task is not self.similar_late:
+            return
+        if (e := task.exception()) is not None:
+            return log_json({"retrieval": {"status": "error", "exception": str(e)}})
+        self.similar_cache, _ = task.result()
+
+    async def late_embedding(self) -> tuple[str, list[float]] | None:
+        """Embedding of the last lookup that missed its budget, once it finishes."""
+        if (task := self.similar_late) is None:
+            return None
+        await asyncio.wait([task])
+        if task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()[1]
+
+    async def store_interaction(
+        self, interaction: Interaction, embedding: tuple[str, list[float]] = None
+    ):
+        """Store messages in database, with the (message id, embedding) from read_similar.
+        Without one, the embedding of a lookup that missed its budget is stored."""
+        if embedding is None:
+            embedding = await self.late_embedding()
         async with self.db.session() as db:
             # insert to message, interaction, and interaction_message tables
             await self.db.insert_interaction_and_messages(db, interaction.id, interaction.messages)
             # insert to message_embedding table
-            if self.embedding_cache is not None:
-                await self.db.insert_message_embedding(db, *self.embedding_cache)
-                self.embedding_cache = None
+            if embedding is not None:
+                await self.db.insert_message_embedding(db, *embedding)
             # insert to message_file table
             if self.audiofiles_cache is not None:
                 await self.db.insert_message_file(db, *self.audiofiles_cache)
@@ -43,6 +43,54 @@ class ChatConfig(BaseModel):
     max_total_tokens: int
     max_system_tokens: int
     temperature: float
+    # Response blocks for speech start at first_block_tokens and grow up to max_block_tokens.
+    first_block_tokens: int = Field(default=8, ge=1)
+    max_block_tokens: int = Field(default=120, ge=1)
+    block_growth: float = Field(default=2.0, ge=1.0)
+    # Long term memory lookup time, the completion starts without it when over.
+    retrieval_budget_sec: float = Field(default=1.0, gt=0.0)
+
+
+class StreamingConfig(BaseModel):
+    enabled: bool = False
+    window_sec: float = Field(default=10.0, ge=5.0, le=25.0)
+    step_sec: float = Field(default=2.0, ge=0.5, le=10.0)
+
+
+class ScreeningConfig(BaseModel):
+    enabled: bool = False
+    model: str = "tiny.en"
+
+
+class DecodingProfile(BaseModel):
+    """Whisper decoding options. Beam size applies at temperature 0, best_of above it."""
+
+    beam_size: int | None = Field(default=None, ge=1)
+    best_of: int | None = Field(default=None, ge=1)
+    temperatures: tuple[float, ...] = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+    compression_ratio_threshold: float | None = 2.4
+    logprob_threshold: float | None = -1.0
+    sample_len: int | None = Field(default=None, ge=1, le=224)
+    condition_on_previous_text: bool = True
+
+
+DECODING_PROFILES = {
+    "fast": DecodingProfile(temperatures=(0.0,), sample_len=96, condition_on_previous_text=False),
+    "balanced": DecodingProfile(best_of=2, temperatures=(0.0, 0.4, 0.8)),
+    "accurate": DecodingProfile(beam_size=5, best_of=5),
+}
+
+
+class ParallelConfig(BaseModel):
+    enabled: bool = False
+    workers: int = Field(default=0, ge=0)
+    min_sec: float = Field(default=45.0, ge=30.0)
+    search_sec: float = Field(default=5.0, gt=0, le=15.0)
+
+
+class EvictionConfig(BaseModel):
+    enabled: bool = False
+    idle_min: float = Field(default=30.0, gt=0)
 
 
 class TranscribeConfig(BaseModel):
@@ -51,11 +99,46 @@ class TranscribeConfig(BaseModel):
     fp16: bool
     initial_prompt: str
     include_assistant_name: bool
+    quantize: bool = False
+    max_requests: int = Field(default=2, ge=1)
+    streaming: StreamingConfig = Field(default_factory=StreamingConfig)
+    screening: ScreeningConfig = Field(default_factory=ScreeningConfig)
+    parallel: ParallelConfig = Field(default_factory=ParallelConfig)
+    eviction: EvictionConfig = Field(default_factory=EvictionConfig)
+    profiles: dict[str, DecodingProfile] = Field(default_factory=lambda: dict(DECODING_PROFILES))
+    profile: str = "balanced"
+
+    @validator("profiles")
+    def include_default_profiles(cls, x: dict[str, DecodingProfile]):
+        return {**DECODING_PROFILES, **x}
+
+    @validator("profile")
+    def known_profile(cls, x: str, values: dict):
+        if x not in values.get("profiles", DECODING_PROFILES):
+            raise ValueError(f"Unknown decoding profile '{x}'.")
+        return x
+
+    @property
+    def decoding(self) -> DecodingProfile:
+        return self.profiles[self.profile]
+
+
+class SpeechCacheConfig(BaseModel):
+    enabled: bool = True
+    directory: str = None
+    max_mb: float = Field(default=64.0, gt=0)
+
+
+class SpeechConfig(BaseModel):
+    # Blocks synthesized ahead of playback, submitted and not yet played.
+    max_requests: int = Field(default=3, ge=1)
+    cache: SpeechCacheConfig = Field(default_factory=SpeechCacheConfig)
 
 
 class ModelsConfig(BaseModel):
     chat: ChatConfig
     transcribe: TranscribeConfig
+    speech: SpeechConfig = Field(default_factory=SpeechConfig)
 
 
 # AUDIO
@@ -70,6 +153,7 @@ class ChannelConfig(BaseModel):
     samplerate: Literal[8000, 16000, 24000] = 2400
     bitrate: Literal[16, 32] = 16
     refreshrate_hz: float = Field(ge=1.0, le=5.0)
+    queue_sec: float = Field(default=120.0, ge=1.0)
 
     _whisper_sr: Literal[16000] = 16000
 
@@ -83,22 +167,53 @@ class ChannelConfig(BaseModel):
         """Sample format for pyaudio"""
         return BITRATE_SPLFRMT[self.bitrate]
 
+    @property
+    def max_queue_chunks(self):
+        """Chunks the input queue can hold before dropping, from queue_sec."""
+        return int(self.queue_sec * self.samplerate / self.chunk) + 1
+
     @property
     def fullscale(self):
         """Get the full scale value from bitrate. 2 ** {bitrate} // 2"""
         return BITRATE_CEIL[self.bitrate]
 
 
+class VADConfig(BaseModel):
+    energy_db: float = Field(default=-45, ge=-80, le=0)
+    zcr: float = Field(default=0.25, gt=0, le=1)
+    flatness: float = Field(default=0.3, gt=0, le=1)
+    min_voiced_sec: float = Field(default=0.25, ge=0)
+
+
+class FloorConfig(BaseModel):
+    adaptive: bool = False
+    percentile: float = Field(default=0.1, gt=0, lt=1)
+    step_db: float = Field(default=0.5, gt=0, le=6)
+    peak_margin_db: float = Field(default=32, ge=0, le=60)
+    rms_margin_db: float = Field(default=18, ge=0, le=60)
+    energy_margin_db: float = Field(default=10, ge=0, le=60)
+
+
 class GateConfig(BaseModel):
     dbpeak: float = Field(ge=-60, le=0)
     dbrms: float = Field(ge=-60, le=0)
     hold_sec: float = Field(ge=1.0, le=5.0)
     tail_sec: float = Field(ge=1.0, le=5.0)
+    max_sec: float = Field(default=60.0, ge=5.0, le=600.0)
+    mode: Literal["peak", "vad"] = "peak"
+    vad: VADConfig = Field(default_factory=VADConfig)
+    floor: FloorConfig = Field(default_factory=FloorConfig)
+
+
+class PlayerConfig(BaseModel):
+    backend: Literal["ffplay", "pyaudio"] = "ffplay"
+    latency_ms: float = Field(default=50, ge=5, le=500)
 
 
 class AudioConfig(BaseModel):
     channel: ChannelConfig
     gate: GateConfig
+    player: PlayerConfig = Field(default_factory=PlayerConfig)
 
 
 # STORAGE
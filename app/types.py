@@ -15,6 +15,7 @@ class Capture(NamedTuple):
     sr: int
     dbpeak: float
     dbrms: float
+    features: Tensor | None = None
 
 
 AudioProcess: TypeAlias = Generator[tuple[int, Capture], int, None]
@@ -25,7 +26,20 @@ class Broadcast:
     def __init__(self) -> None:
         ...
 
-    def mon(self, peak: float, rms: float, time: float, gate: bool):
+    def mon(
+        self,
+        peak: float,
+        rms: float,
+        time: float,
+        gate: bool,
+        overflows: int = 0,
+        drops: int = 0,
+        rejected: int = 0,
+        floor: float = None,
+    ):
+        ...
+
+    def partial(self, text: str):
         ...
 
     def clear():
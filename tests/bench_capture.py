@@ -0,0 +1,52 @@
+"""
+Per-chunk cost of growing a gate capture with torch.cat vs writing into CaptureBuffer.
+
+    python -m tests.bench_capture
+"""
+from torch import Tensor, cat, rand
+from time import perf_counter
+
+from app.audio.buffer import CaptureBuffer
+
+SR = 24000
+CHUNK = 2048
+HOLD, TAIL, MAX = 2 * SR, 1 * SR, 60 * SR
+
+
+def run_cat(chunks: list[Tensor]):
+    X = Tensor([])
+    for x in chunks:
+        X = cat((X, x), 0)
+    return X
+
+
+def run_buffer(chunks: list[Tensor], buffer: CaptureBuffer):
+    buffer.reset()
+    for x in chunks:
+        buffer.write(x)
+    return buffer.view()
+
+
+def measure(func, *args, repeat: int = 5) -> float:
+    """Best time of repeat runs in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t = perf_counter()
+        func(*args)
+        best = min(best, perf_counter() - t)
+    return best
+
+
+def main():
+    buffer = CaptureBuffer(2 * (HOLD + TAIL), MAX)
+    print(f"{'capture':>8} {'chunks':>7} {'cat us/chunk':>13} {'buffer us/chunk':>16}")
+    for seconds in (1, 10, 60):
+        chunks = [rand(CHUNK) for _ in range(seconds * SR // CHUNK)]
+        t_cat = measure(run_cat, chunks)
+        t_buf = measure(run_buffer, chunks, buffer)
+        n = len(chunks)
+        print(f"{seconds:>7}s {n:>7} {t_cat / n * 1e6:>13.1f} {t_buf / n * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+End to end throughput of gate -> Transcribe.predict -> Chat.start without a microphone.
+
+    python -m tests.bench_pipeline --replay files/2023-06-04 --pattern "*_1.ogg"
+    python -m tests.bench_pipeline --seconds 60
+    python -m tests.bench_pipeline --replay files/2023-06-04 --chat
+"""
+from time import perf_counter
+import argparse
+
+from app.audio import AudioChannel, FileSource, SignalSource, Transcribe
+from app.system.config import Config
+from app.chat import Chat, Context
+
+
+class Monitor:
+    """Silent broadcast, keeps last input counters."""
+
+    def mon(self, peak, rms, time, gate, **counters):
+        self.counters = counters
+
+
+def main(argv):
+    config = Config.from_toml(argv.config)
+    if argv.replay:
+        source = FileSource(
+            argv.replay, config.audio.channel, realtime=False, pattern=argv.pattern
+        )
+    else:
+        source = SignalSource(config.audio.channel, realtime=False, seconds=argv.seconds)
+    channel = AudioChannel()
+    channel.load(config.audio, source=source)
+    transcribe = Transcribe(config.models.transcribe, config.audio.channel.samplerate)
+    chat = Chat(config.models.chat, Context.from_yaml(argv.context)) if argv.chat else None
+    timings = {"gate": 0.0, "transcribe": 0.0, "chat": 0.0}
+    n_captures, audio_sec = 0, 0.0
+    t = perf_counter()
+    process = channel.start(Monitor(), 0)
+    for _, capture in process:
+        timings["gate"] += perf_counter() - t
+        t = perf_counter()
+        prompt = transcribe.predict(capture.data)
+        timings["transcribe"] += perf_counter() - t
+        if chat is not None and prompt:
+            t = perf_counter()
+            for _ in chat.start(chat.user_message(prompt)):
+                ...
+            timings["chat"] += perf_counter() - t
+        n_captures += 1
+        audio_sec += capture.size / capture.sr
+        print(f"{capture}: {prompt}")
+        t = perf_counter()
+        process.send(0)
+    timings["gate"] += perf_counter() - t
+    print(f"\n{n_captures} captures, {audio_sec:.1f} s of captured audio")
+    for stage, seconds in timings.items():
+        print(f"{stage:>10}: {seconds:8.2f} s  rtf {seconds / max(audio_sec, 1e-9):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="config.toml")
+    parser.add_argument("--context", type=str, default="context.yml")
+    parser.add_argument("--replay", type=str, default=None, help="Audio file or directory.")
+    parser.add_argument("--pattern", type=str, default="*", help="Glob for replay directory.")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Synthetic input length.")
+    parser.add_argument("--chat", action="store_true", help="Include chat completions.")
+    main(parser.parse_args())
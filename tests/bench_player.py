@@ -0,0 +1,64 @@
+"""
+Gaps between consecutive speech blocks, ffplay process per block vs the pyaudio output stream.
+
+    python -m tests.bench_player
+    python -m tests.bench_player --blocks 20 --seconds 0.5
+
+Blocks are ogg tones queued back to back like synthesized sentences. The mean gap is the
+playback wall time over the blocks' total duration, per block, so it includes process
+startup and device opening. Needs an audio output device and ffplay.
+"""
+from torchaudio import save
+from time import perf_counter
+from torch import arange, sin
+from io import BytesIO
+from math import pi
+import argparse
+
+from app.audio.player import Player
+from app.system.config import Config
+
+
+def blocks(samplerate: int, n: int, seconds: float) -> list[bytes]:
+    t = arange(int(samplerate * seconds)) / samplerate
+    data = []
+    for i in range(n):
+        file = BytesIO()
+        save(file, 0.2 * sin(2 * pi * (220 + 20 * i) * t)[None], samplerate, format="ogg")
+        data.append(file.getvalue())
+    return data
+
+
+def measure(player: Player, data: list[bytes], seconds: float) -> float:
+    """Mean gap per block in seconds."""
+    t = perf_counter()
+    for block in data:
+        player.queue([block])
+    player.wait()
+    return (perf_counter() - t - seconds * len(data)) / len(data)
+
+
+def main(argv):
+    config = Config.from_toml(argv.config)
+    data = blocks(config.audio.channel.samplerate, argv.blocks, argv.seconds)
+    for backend in argv.backends:
+        config.audio.player.backend = backend
+        player = Player(config.audio)
+        gap = measure(player, data, argv.seconds)
+        line = (
+            f"{backend:>8}: {argv.blocks} blocks of {argv.seconds} s, mean gap {gap * 1e3:7.1f} ms"
+        )
+        if player.buffer.gaps:
+            gaps = player.buffer.gaps[1:]
+            line += f", buffer gaps max {max(gaps, default=0) * 1e3:.1f} ms"
+        print(line)
+        player.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="config.toml")
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=1.0, help="Duration of each block.")
+    parser.add_argument("--backends", nargs="+", default=["ffplay", "pyaudio"])
+    main(parser.parse_args())
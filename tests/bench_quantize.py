@@ -0,0 +1,87 @@
+"""
+Real-time factor and word error rate of the int8 quantized Whisper model vs float32.
+
+    python -m tests.bench_quantize --replay files/2023-06-04 --pattern "*_1.ogg"
+    python -m tests.bench_quantize --replay files/2023-06-04 --references references.txt
+
+Without references, float32 transcripts are the reference and its WER is 0.
+"""
+from time import perf_counter
+from torch import Tensor
+import argparse
+import string
+
+from app.audio import AudioChannel, FileSource, Transcribe
+from app.system.config import Config
+
+from tests.bench_pipeline import Monitor
+
+
+def words(text: str) -> list[str]:
+    return text.lower().translate(str.maketrans("", "", string.punctuation)).split()
+
+
+def edit_distance(a: list[str], b: list[str]) -> int:
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, y in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (x != y))
+    return row[-1]
+
+
+def wer(references: list[str], hypotheses: list[str]) -> float:
+    errors = sum(edit_distance(words(r), words(h)) for r, h in zip(references, hypotheses))
+    return errors / max(sum(len(words(r)) for r in references), 1)
+
+
+def captures(config: Config, path: str, pattern: str) -> list[Tensor]:
+    """Gate the replayed files once, copying captures out of the reused buffer."""
+    channel = AudioChannel()
+    source = FileSource(path, config.audio.channel, realtime=False, pattern=pattern)
+    channel.load(config.audio, source=source)
+    process, data = channel.start(Monitor(), 0), []
+    for _, capture in process:
+        data.append(capture.data.clone())
+        process.send(0)
+    return data
+
+
+def run(transcribe: Transcribe, data: list[Tensor], sr: int) -> tuple[list[str], float]:
+    texts, seconds = [], 0.0
+    for X in data:
+        t = perf_counter()
+        texts.append(transcribe.predict(X))
+        seconds += perf_counter() - t
+    return texts, seconds / (sum(X.shape[0] for X in data) / sr)
+
+
+def main(argv):
+    config = Config.from_toml(argv.config)
+    sr = config.audio.channel.samplerate
+    data = captures(config, argv.replay, argv.pattern)
+    results = {}
+    for quantize in (False, True):
+        config.models.transcribe.quantize = quantize
+        transcribe = Transcribe(config.models.transcribe, sr)
+        results["int8" if quantize else "float32"] = run(transcribe, data, sr)
+        transcribe.close()
+    if argv.references:
+        with open(argv.references) as file:
+            references = file.read().splitlines()
+    else:
+        references = results["float32"][0]
+    print(f"{len(data)} captures, model {config.models.transcribe.model}")
+    errors = {name: wer(references, texts) for name, (texts, _) in results.items()}
+    for name, (_, rtf) in results.items():
+        print(f"{name:>8}: rtf {rtf:.3f}  wer {errors[name]:.3f}")
+    print(f"   delta: wer {errors['int8'] - errors['float32']:+.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="config.toml")
+    parser.add_argument("--replay", type=str, required=True, help="Audio file or directory.")
+    parser.add_argument("--pattern", type=str, default="*", help="Glob for replay directory.")
+    parser.add_argument("--references", type=str, default=None, help="One line per capture.")
+    main(parser.parse_args())
@@ -0,0 +1,110 @@
+"""
+Streamer segmenting cost on large completion streams, compared to per-token string concatenation.
+
+    python -m tests.bench_streamer
+    python -m tests.bench_streamer --replay stream.jsonl
+
+A replay file holds one recorded completion event per line, as returned by the API.
+Without one, long answers made of paragraphs and code blocks are streamed in 4 char deltas.
+"""
+from tiktoken import encoding_for_model
+from time import perf_counter
+import argparse
+import json
+import re
+
+from app.chat.streamer import Streamer
+
+
+def synthetic(paragraphs: int, code_lines: int) -> list[dict]:
+    text = "This paragraph explains the next step of the solution in some detail. " * 6
+    code = (
+        "```python\n" + "".join(f"value_{i} = compute({i})\n" for i in range(code_lines)) + "```"
+    )
+    content = "\n\n".join(text if i % 4 else code for i in range(paragraphs)) + "\n\n"
+    events = [{"choices": [{"delta": {"role": "assistant"}}]}]
+    events += [
+        {"choices": [{"delta": {"content": content[i : i + 4]}}]}
+        for i in range(0, len(content), 4)
+    ]
+    return events + [{"choices": [{"delta": {}}]}]
+
+
+def legacy(generator, min_block_size=40):
+    """Previous reader and request, line += token and a regex over every line."""
+    NEW_LINE, NEW_CODE = "\n\n", "```"
+
+    def reader():
+        line, token_count = "", 0
+        for event in generator:
+            delta = event["choices"][0]["delta"]
+            if "content" in delta:
+                line += delta["content"]
+                token_count += 1
+            if not delta or NEW_LINE in line:
+                yield line, token_count
+                line, token_count = "", 0
+
+    is_code, block_size, block = False, 0, []
+    for line, count in reader():
+        if NEW_CODE in line:
+            if len(re.findall(NEW_CODE, line)) == 2:
+                yield "".join(block), block_size
+                yield line, count
+                block, block_size = [], 0
+                continue
+            is_code = not is_code
+            if is_code:
+                yield "".join(block), block_size
+                block, block_size = [line], count
+            else:
+                block.append(line)
+                yield "".join(block), block_size
+                block, block_size = [], 0
+        else:
+            block.append(line)
+            block_size += count
+        if block_size >= min_block_size and not is_code:
+            yield "".join(block), block_size
+            block, block_size = [], 0
+    if block_size > 0:
+        yield "".join(block), block_size
+
+
+def measure(func, events: list[dict], repeat: int = 3) -> tuple[float, list]:
+    best, blocks = float("inf"), []
+    for _ in range(repeat):
+        t = perf_counter()
+        blocks = list(func(iter(events)))
+        best = min(best, perf_counter() - t)
+    return best, blocks
+
+
+def main(argv):
+    if argv.replay:
+        with open(argv.replay) as file:
+            runs = {argv.replay: [json.loads(line) for line in file if line.strip()]}
+    else:
+        runs = {
+            f"{n} paragraphs, {lines} line code": synthetic(n, lines)
+            for n, lines in ((20, 10), (100, 50), (100, 500))
+        }
+    encoder = encoding_for_model(argv.model)
+    streamer = Streamer(encoder)
+    for name, events in runs.items():
+        t_old, old = measure(legacy, events)
+        t_new, new = measure(streamer.blocks, events)
+        content = "".join(block for block, _ in new)
+        assert content == "".join(block for block, _ in old)
+        print(
+            f"{name:>28}: {len(events)} events, legacy {t_old * 1e3:8.2f} ms, "
+            f"streamer {t_new * 1e3:8.2f} ms, {len(new)} blocks, "
+            f"{sum(n for _, n in old)} deltas, {len(encoder.encode(content))} tokens"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", type=str, default=None, help="JSON lines of events.")
+    parser.add_argument("--model", type=str, default="gpt-3.5-turbo", help="Tokenizer model.")
+    main(parser.parse_args())
@@ -0,0 +1,65 @@
+from app.audio import AudioChannel, SignalSource
+from app.audio.features import FeatureBuilder
+from app.system.config import Config
+
+config = Config.from_toml("config.toml")
+
+
+class Monitor:
+    def mon(self, peak, rms, time, gate, **counters):
+        ...
+
+
+def test_gate_with_signal_source():
+    """Tone bursts of 2 s every 6 s over 30 s, each burst is one capture."""
+    source = SignalSource(config.audio.channel, realtime=False, seconds=30, on_sec=2, off_sec=4)
+    channel = AudioChannel()
+    channel.load(config.audio, source=source)
+    process = channel.start(Monitor(), 0)
+    captures = []
+    for _, capture in process:
+        captures.append(capture)
+        process.send(0)
+    assert len(captures) == 5
+    for capture in captures:
+        assert 2.0 < capture.size / capture.sr < 3.5
+        assert capture.dbpeak > config.audio.gate.dbpeak
+    # timed by the source's sample clock, bursts start every 6 s
+    starts = [capture.started_at - source.t0 for capture in captures]
+    assert all(abs(start - 6 * i) < 0.1 for i, start in enumerate(starts))
+    assert all(abs(c.ended_at - c.started_at - c.size / c.sr) < 1e-6 for c in captures)
+
+
+def test_vad_gate_follows_noise_floor():
+    """Bursts over a -40 dB noise floor, vad energy threshold adapts above the floor."""
+    audio = config.audio.copy(deep=True)
+    audio.gate.mode = "vad"
+    audio.gate.floor.adaptive = True
+    source = SignalSource(audio.channel, realtime=False, seconds=30, noise_db=-40)
+    channel = AudioChannel()
+    channel.load(audio, source=source)
+    process = channel.start(Monitor(), 0)
+    captures = []
+    for _, capture in process:
+        captures.append(capture)
+        process.send(0)
+    assert len(captures) == 5
+
+
+def test_dropped_captures_stop_features():
+    """Every burst is under the rms threshold, the builder is stopped instead of finished."""
+
+    class Features(FeatureBuilder):
+        stops = 0
+
+        def stop(self):
+            self.stops += 1
+
+    audio = config.audio.copy(deep=True)
+    audio.gate.dbrms = 0
+    source = SignalSource(audio.channel, realtime=False, seconds=30)
+    features = Features(None, audio.channel.samplerate, audio.channel.samplerate, 80)
+    channel = AudioChannel()
+    channel.load(audio, source=source)
+    assert list(channel.start(Monitor(), 0, features)) == []
+    assert features.stops == 5
@@ -0,0 +1,30 @@
+from app.audio.capture import Capture
+from app.audio.buffer import CaptureBuffer
+from torch import arange, float32, int16, tensor
+
+
+def test_capture_buffer_grows_and_caps():
+    buffer = CaptureBuffer(4, 10)
+    x = arange(3, dtype=float32)
+    for _ in range(5):
+        buffer.write(x)
+    assert buffer.full
+    assert buffer.capacity == 10
+    assert buffer.view().tolist() == [0, 1, 2, 0, 1, 2, 0, 1, 2, 0]
+    assert buffer.view(4).tolist() == [0, 1, 2, 0]
+
+
+def test_capture_buffer_view_survives_next_capture():
+    buffer = CaptureBuffer(8, 8)
+    buffer.write(arange(4, dtype=float32))
+    view = buffer.view()
+    buffer.reset()
+    buffer.write(arange(4, 8, dtype=float32))
+    assert view.tolist() == [0, 1, 2, 3]
+    assert buffer.view().tolist() == [4, 5, 6, 7]
+
+
+def test_capture_normalized_once():
+    capture = Capture(tensor([-(2**15), 0, 2**14], dtype=int16), 3, 16000, 0.0, 0.0)
+    assert capture.normalized is capture.normalized
+    assert capture.normalized.tolist() == [-1.0, 0.0, 0.5]
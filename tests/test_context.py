@@ -0,0 +1,57 @@
+from datetime import date
+from pathlib import Path
+import yaml
+
+import app.chat
+from app.chat import Chat
+from app.chat.context import Context
+from app.system.config import Config
+
+
+class Encoder:
+    """Counts encoded texts, one token per word."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def encode(self, text: str) -> list[int]:
+        self.calls += 1
+        return [len(word) for word in text.split()]
+
+
+def write(path: Path, **changes) -> Path:
+    data = yaml.safe_load(Path("context.yml").read_text())
+    data["user"].update(changes)
+    path.write_text(yaml.safe_dump(data))
+    return path
+
+
+def test_update_only_on_changes(tmp_path):
+    file = write(tmp_path / "context.yml")
+    context = Context.from_yaml(str(file))
+    digest = context.digest
+    assert not context.update() and context.digest == digest
+    write(file, name="Ana")
+    assert context.update() and context.digest != digest
+    assert context.user.name == "Ana"
+    assert not context.update()
+
+
+def test_digest_of_dates(tmp_path):
+    file = write(tmp_path / "context.yml", since=date(2023, 5, 1))
+    assert Context.from_yaml(str(file)).digest == Context.from_yaml(str(file)).digest
+
+
+def test_prompt_is_reused_until_context_changes(tmp_path, monkeypatch):
+    encoder = Encoder()
+    monkeypatch.setattr(app.chat, "encoding_for_model", lambda model: encoder)
+    file = write(tmp_path / "context.yml")
+    context = Context.from_yaml(str(file))
+    chat = Chat(Config.from_toml("config.toml").models.chat, context)
+    prompt = chat.prompt
+    calls = encoder.calls
+    context.update()
+    assert chat.prompt is prompt and encoder.calls == calls
+    write(file, name="Ana")
+    context.update()
+    assert chat.prompt is not prompt and "Ana" in chat.prompt.system
@@ -0,0 +1,36 @@
+from torchaudio.transforms import Resample
+from whisper.audio import log_mel_spectrogram
+from torch import Generator, randn, float32
+
+from app.audio.features import FeatureBuilder
+
+SR, CHUNK = 24000, 2048
+
+
+def test_incremental_features_match_whisper():
+    X = randn(SR * 5, generator=Generator().manual_seed(0)) * 0.1
+    resample = Resample(SR, 16000, dtype=float32)
+    builder = FeatureBuilder(resample, SR, 16000, 80)
+    for size in (X.shape[0], SR * 3 + 123):
+        builder.reset()
+        for i in range(0, X.shape[0], CHUNK):
+            builder.feed(X[i : i + CHUNK])
+        mel = builder.finish(size)
+        expected = log_mel_spectrogram(resample(X[:size]), 80)
+        assert mel.shape == expected.shape
+        assert (mel - expected).abs().max() < 1e-4
+
+
+def test_window_is_scaled_like_finish():
+    """A quiet window is clamped below the loud start of the capture, not its own max."""
+    X = randn(SR * 4, generator=Generator().manual_seed(0)) * 0.1
+    X[SR:] *= 1e-3
+    resample = Resample(SR, 16000, dtype=float32)
+    builder = FeatureBuilder(resample, SR, 16000, 80)
+    for i in range(0, X.shape[0], CHUNK):
+        builder.feed(X[i : i + CHUNK])
+    start, stop = 200, builder.n_frames
+    window, silence = builder.window(start, stop)
+    mel = builder.finish()
+    assert (window - mel[:, start:stop]).abs().max() < 1e-4
+    assert abs(silence - (float(mel.max()) - 2.0)) < 1e-4
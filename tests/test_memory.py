@@ -0,0 +1,39 @@
+from app.chat.message import Message, ROLES
+from app.chat.memory import ShortTerm
+import random
+
+
+def pair(i: int, n_user: int, n_assistant: int):
+    return (
+        Message.new(ROLES.USER, f"question {i}", n_tokens=n_user),
+        Message.new(ROLES.ASSISTANT, f"answer {i}", n_tokens=n_assistant),
+    )
+
+
+def newest(pairs: list, budget: int) -> list:
+    """Linear selection, newest pairs first until one does not fit."""
+    messages, n_tokens = [], 0
+    for user, assistant in reversed(pairs):
+        n_tokens += user.n_tokens + assistant.n_tokens
+        if n_tokens > budget:
+            break
+        messages = [user, assistant, *messages]
+    return messages
+
+
+def test_select_matches_linear_scan():
+    rng = random.Random(0)
+    memory, pairs = ShortTerm(max_tokens=500), []
+    for i in range(200):
+        pairs.append(pair(i, rng.randint(1, 40), rng.randint(1, 120)))
+        memory.append(*pairs[-1])
+        assert memory.n_tokens <= 500
+        for budget in (-1, 0, 50, 200, 500, 1000):
+            assert memory.select(budget) == newest(pairs, min(budget, 500))
+
+
+def test_clear():
+    memory = ShortTerm(max_tokens=100)
+    memory.append(*pair(0, 10, 20))
+    memory.clear()
+    assert len(memory) == 0 and memory.select(100) == []
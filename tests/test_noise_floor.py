@@ -0,0 +1,36 @@
+from app.audio.noise import NoiseFloor
+
+
+def test_noise_floor_follows_step_change():
+    floor = NoiseFloor(-60.0, percentile=0.1, step=0.5)
+    for _ in range(200):
+        floor.update(-50.0)
+    assert -51.0 < floor.value < -50.0
+    # louder background, rises at step * percentile per chunk
+    for _ in range(200):
+        floor.update(-30.0)
+    assert -41.0 < floor.value < -39.0
+    for _ in range(400):
+        floor.update(-30.0)
+    assert -31.0 < floor.value < -30.0
+    # quieter background, falls at step * (1 - percentile) per chunk
+    for _ in range(100):
+        floor.update(-70.0)
+    assert -71.0 < floor.value < -69.0
+
+
+def test_noise_floor_ignores_short_bursts():
+    """Speech over a steady background barely moves the low percentile."""
+    floor = NoiseFloor(-50.0, percentile=0.1, step=0.5)
+    for i in range(1000):
+        floor.update(-20.0 if i % 4 else -50.0)
+    assert floor.value < -45.0
+
+
+def test_noise_floor_threshold_is_clamped():
+    floor = NoiseFloor(-50.0)
+    assert floor.threshold(18, -60) == -32.0
+    floor.value = -100.0
+    assert floor.threshold(18, -60) == -60
+    floor.value = -5.0
+    assert floor.threshold(18, -60) == 0
@@ -0,0 +1,96 @@
+from concurrent.futures import Future
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+from app.audio.player import JitterBuffer, Player
+from app.system.config import Config
+
+
+def test_jitter_buffer_pads_and_completes_clips():
+    buffer, first, second, started = JitterBuffer(), Future(), Future(), Future()
+    buffer.put(b"\x01" * 6, first)
+    buffer.put(b"\x02" * 6, second, started)
+    assert buffer.get(4) == b"\x01" * 4 and not first.done()
+    assert not started.done()
+    assert buffer.get(4) == b"\x01" * 2 + b"\x02" * 2 and first.done()
+    assert started.result() > 0
+    assert buffer.get(8) == b"\x02" * 4 + bytes(4) and second.done()
+    # the second clip was queued while the first played
+    assert buffer.gaps == [0.0]
+
+
+def test_jitter_buffer_clear_cancels():
+    buffer, future = JitterBuffer(), Future()
+    buffer.put(b"\x01" * 6, future)
+    buffer.clear()
+    assert future.cancelled() and buffer.get(4) == bytes(4)
+
+
+class Stream:
+    """Output stream that pulls from the callback on a thread, like PortAudio."""
+
+    def __init__(self, rate, channels, frmt, output, frames_per_buffer, stream_callback):
+        self.callback, self.frames = stream_callback, frames_per_buffer
+        self.played, self.running = [], Event()
+
+    def start_stream(self):
+        self.running.set()
+        Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while self.running.is_set():
+            data, _ = self.callback(None, self.frames, {}, 0)
+            self.played.append(data.strip(b"\x00"))
+            sleep(0.001)
+
+    def stop_stream(self):
+        self.running.clear()
+
+    def close(self):
+        pass
+
+
+class Audio:
+    def open(self, *args, **kwargs):
+        self.stream = Stream(*args, **kwargs)
+        return self.stream
+
+
+def player(monkeypatch) -> Player:
+    monkeypatch.setattr(Player, "decode", lambda self, data: data)
+    config = Config.from_toml("config.toml").audio
+    config.player.backend = "pyaudio"
+    return Player(config, Audio())
+
+
+def test_player_plays_in_order(monkeypatch):
+    audio = player(monkeypatch)
+    clips = [bytes([i]) * 4096 for i in range(1, 5)]
+    t = perf_counter()
+    assert not audio.played_between(t - 1, t)
+    futures = [audio.queue([clip]) for clip in clips]
+    audio.wait(5)
+    # a capture recorded while playing overlaps it, not one recorded before or after
+    now = perf_counter()
+    assert audio.played_between(t - 1, t + 0.001) and audio.played_between(now - 1, now)
+    assert not audio.played_between(t - 1, t - 0.5) and not audio.played_between(now, now + 1)
+    assert all(future.done() and not future.cancelled() for future in futures)
+    assert b"".join(audio.audio.stream.played) == b"".join(clips)
+    audio.close()
+
+
+def test_player_cancel(monkeypatch):
+    audio = player(monkeypatch)
+    release = Event()
+    slow = audio.decode
+    monkeypatch.setattr(audio, "decode", lambda data: release.wait() and slow(data))
+    futures = [audio.queue([bytes([i]) * 4096]) for i in range(1, 4)]
+    audio.cancel()
+    release.set()
+    assert all(future.cancelled() for future in futures) and not audio.is_playing
+    # the worker skips what was dropped and keeps playing new audio
+    future = audio.queue([b"\x05" * 4096])
+    audio.wait(5)
+    assert future.done() and not future.cancelled()
+    assert b"".join(audio.audio.stream.played) == b"\x05" * 4096
+    audio.close()
@@ -0,0 +1,31 @@
+from app.chat.message import Message, ROLES
+from app.storage import Storage
+import asyncio
+
+
+def test_budget_misses_and_late_results():
+    storage = Storage()
+    storage.similar_cache = storage.similar_late = None
+    storage.retrieval = {"calls": 0, "misses": 0}
+    delays = [0.3, 0.0, 0.3, 0.3]
+
+    async def read_similar(message: Message, exclude=None):
+        await asyncio.sleep(delays.pop(0))
+        return [message.content], (message.id, [0.0])
+
+    storage.read_similar = read_similar
+
+    async def main():
+        read = lambda text: storage.read_similar_within(Message.new(ROLES.USER, text), None, 0.1)
+        assert await read("a") == ([], None)
+        # the miss still has its embedding stored
+        assert await storage.late_embedding() == (Message.new(ROLES.USER, "a").id, [0.0])
+        # a hit discards the late result of the miss before it
+        assert (await read("b"))[0] == ["b"]
+        await asyncio.sleep(0.3)
+        assert await read("c") == ([], None)
+        await asyncio.sleep(0.3)
+        # the next miss returns the late result
+        assert await read("d") == (["c"], None)
+
+    asyncio.run(main())
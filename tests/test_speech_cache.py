@@ -0,0 +1,44 @@
+from app.speech.cache import SpeechCache
+import os
+
+
+def request(text: str) -> dict:
+    return {"Text": f"<speak>{text}</speak>", "VoiceId": "Salli", "SampleRate": "24000"}
+
+
+def test_hits_and_misses(tmp_path):
+    cache = SpeechCache(tmp_path, max_mb=1)
+    assert cache.get(request("Hello")) is None
+    cache.put(request("Hello"), b"ogg" * 10)
+    assert cache.get(request("Hello")) == b"ogg" * 10
+    assert cache.get(request("Hello there")) is None
+    # a second process sharing the directory
+    assert SpeechCache(tmp_path, max_mb=1).get(request("Hello")) == b"ogg" * 10
+    assert cache.stats == {"hits": 1, "misses": 2, "hit_ratio": 1 / 3, "bytes_saved": 30}
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = SpeechCache(tmp_path, max_mb=3 / 2**20)
+    for i, text in enumerate(("a", "b", "c")):
+        cache.put(request(text), b"x")
+        os.utime(cache.path(request(text)), (i, i))
+    cache.get(request("a"))
+    cache.put(request("d"), b"x")
+    assert [cache.get(request(text)) for text in "abcd"] == [b"x", None, b"x", b"x"]
+
+
+def test_stale_temporary_files_are_removed(tmp_path):
+    stale, fresh = tmp_path / "a.1.2.tmp", tmp_path / "b.1.3.tmp"
+    stale.write_bytes(b"x" * 10)
+    fresh.write_bytes(b"x" * 10)
+    os.utime(stale, (0, 0))
+    cache = SpeechCache(tmp_path, max_mb=1)
+    # the fresh one may still be written by another process
+    assert not stale.exists() and fresh.exists() and cache.size == 0
+
+
+def test_failed_writes_are_skipped(tmp_path):
+    cache = SpeechCache(tmp_path, max_mb=1)
+    cache.path(request("Hello")).mkdir()
+    cache.put(request("Hello"), b"ogg")
+    assert cache.size == 0 and not list(tmp_path.glob("*.tmp"))
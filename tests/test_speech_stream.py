@@ -0,0 +1,55 @@
+from app.speech.stream import SpeechStream
+from threading import Event, Timer
+from time import sleep
+import io
+
+
+class Body(io.BytesIO):
+    """Response body that holds its second half until released."""
+
+    def __init__(self, data: bytes) -> None:
+        super().__init__(data)
+        self.half = len(data) // 2
+        self.release = Event()
+
+    def read(self, size: int = -1) -> bytes:
+        if self.tell() >= self.half:
+            self.release.wait()
+        return super().read(min(size, self.half))
+
+
+def test_readers_get_chunks_as_they_arrive():
+    data = bytes(range(256)) * 64
+    completed = []
+    body = Body(data)
+    stream = SpeechStream(body, chunk_size=1024, on_complete=completed.append)
+    reader = iter(stream)
+    assert next(reader) == data[:1024]
+    assert not stream.done
+    body.release.set()
+    assert next(reader) + b"".join(reader) == data[1024:]
+    assert stream.read() == data
+    # on_complete runs on the reading thread once the body ends
+    for _ in range(100):
+        if completed:
+            break
+        sleep(0.01)
+    assert body.closed and completed == [data]
+
+
+def test_close_wakes_readers():
+    """A reader waiting on a slow body returns once the stream is closed."""
+    data = bytes(range(256)) * 64
+    body = Body(data)
+    stream = SpeechStream(body, chunk_size=1024)
+    reader = iter(stream)
+    assert next(reader) == data[:1024]
+    Timer(0.05, stream.close).start()
+    assert b"".join(reader) == data[1024 : body.half]
+    assert stream.done and stream.closed
+    body.release.set()
+
+
+def test_cached_data():
+    stream = SpeechStream(data=b"ogg")
+    assert list(stream) == [b"ogg"] and stream.read() == b"ogg"
@@ -0,0 +1,102 @@
+from threading import Event, Lock
+from time import sleep
+import asyncio
+
+from app.speech import Speech
+from app.system.config import SpeechConfig
+
+
+class Blocks:
+    """Response blocks, counts the ones read and if it was closed."""
+
+    def __init__(self, n: int, delay: float = 0.0) -> None:
+        self.n, self.delay = n, delay
+        self.read, self.closed = 0, False
+
+    async def __call__(self):
+        try:
+            for i in range(self.n):
+                await asyncio.sleep(self.delay)
+                self.read += 1
+                yield f"block {i}"
+        finally:
+            self.closed = True
+
+
+def speech(synthesize) -> Speech:
+    model = Speech(None, 24000, polly=object(), config=SpeechConfig(max_requests=3))
+    model.synthesize = synthesize
+    return model
+
+
+def test_blocks_are_yielded_in_order():
+    """Later blocks finish first, at most max_requests run at once."""
+    running, top, lock = [0], [0], Lock()
+
+    def synthesize(text: str):
+        with lock:
+            running[0] += 1
+            top[0] = max(top[0], running[0])
+        sleep(0.05 * (5 - int(text.split()[-1]) % 5))
+        with lock:
+            running[0] -= 1
+        return text.upper() if text != "block 3" else None
+
+    async def main():
+        blocks = Blocks(8)
+        model = speech(synthesize)
+        streams = [stream async for stream in model.asynthesize(blocks())]
+        model.close()
+        return streams, blocks
+
+    streams, blocks = asyncio.run(main())
+    # empty results are skipped
+    assert streams == [f"BLOCK {i}" for i in range(8) if i != 3]
+    assert blocks.closed and top[0] == 3
+
+
+def test_closing_stops_synthesis():
+    release, started = Event(), []
+
+    def synthesize(text: str):
+        started.append(text)
+        release.wait(5)
+        return text
+
+    async def main():
+        blocks = Blocks(20, delay=0.01)
+        model = speech(synthesize)
+        release.set()
+        stream = model.asynthesize(blocks())
+        assert await anext(stream) == "block 0"
+        release.clear()
+        await stream.aclose()
+        release.set()
+        model.close()
+        return blocks
+
+    blocks = asyncio.run(main())
+    assert blocks.closed and blocks.read < 20 and len(started) <= 1 + 3
+
+
+def test_cancelling_the_consumer():
+    async def main():
+        blocks = Blocks(20, delay=0.01)
+        model = speech(lambda text: sleep(0.05) or text)
+        played = []
+
+        async def play():
+            async for stream in model.asynthesize(blocks()):
+                played.append(stream)
+
+        task = asyncio.create_task(play())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        model.close()
+        return blocks, played
+
+    blocks, played = asyncio.run(main())
+    assert played == [f"block {i}" for i in range(len(played))] and 0 < len(played) < 20
+    assert blocks.closed and blocks.read < 20
@@ -0,0 +1,41 @@
+from app.chat.streamer import Streamer, Lines
+
+
+def events(content: str, size: int):
+    yield {"choices": [{"delta": {"role": "assistant"}}]}
+    for i in range(0, len(content), size):
+        yield {"choices": [{"delta": {"content": content[i : i + size]}}]}
+    yield {"choices": [{"delta": {}}]}
+
+
+def test_fences_split_across_deltas():
+    lines = Lines()
+    assert lines.feed("Run ``") == []
+    assert lines.feed("`python\nx = 1\n`") == []
+    assert lines.feed("``\n\nNext") == [("Run ```python\nx = 1\n```\n\n", 3, 2)]
+    assert lines.take() == ("Next", 1, 0)
+
+
+def test_blocks_keep_code_whole():
+    text = "Some text that explains the code below. " * 4
+    code = "```python\na = 1\n\nb = 2\n```"
+    content = f"{text}\n\n{code}\n\n{text}\n\n"
+    for size in (1, 3, 7):
+        blocks = [block for block, _ in Streamer().blocks(events(content, size), 20)]
+        assert "".join(blocks) == content
+        assert f"{code}\n\n" in blocks
+
+
+def test_sentences_skip_numbers_and_code():
+    content = "Steps:\n1. Open `a. b` now. Then close.\n2. Run it! ```\nx. y\n``` Done. ok"
+    for size in (1, 2, 5, len(content)):
+        lines, out = Lines(), []
+        for i in range(0, len(content), size):
+            out.extend(line for line, *_ in lines.feed(content[i : i + size]))
+        out.append(lines.take()[0])
+        assert out == [
+            "Steps:\n1. Open `a. b` now. ",
+            "Then close.\n2. Run it! ",
+            "```\nx. y\n``` Done. ",
+            "ok",
+        ]
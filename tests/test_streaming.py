@@ -0,0 +1,135 @@
+from torch import Generator, Tensor, randn
+from types import SimpleNamespace
+from time import sleep
+
+from app.audio.streaming import StreamingFeatures
+from app.audio.transcribe import Tier
+from app.system.config import StreamingConfig
+
+SR, CHUNK = 16000, 1600
+BEGIN = 1000
+
+
+class Tokenizer:
+    timestamp_begin = BEGIN
+
+    def decode(self, tokens: list[int]) -> str:
+        return " ".join(f"w{token}" for token in tokens if token < BEGIN)
+
+
+class Model:
+    """Transcribe stub, decodes windows to scripted tokens."""
+
+    def __init__(self, *results: list[int]) -> None:
+        self.results = list(results)
+        self.tiers = {"full": Tier("full", object())}
+        self.tokenizer = Tokenizer()
+        self.initial_prompt_tokens = [7]
+        self.prompts, self.tails = [], []
+
+    def segment(self, mel: Tensor, silence: float, model=None) -> Tensor:
+        return mel
+
+    def decode_with_fallback(self, segment, prompt, timestamps=False, model=None):
+        self.prompts.append(prompt)
+        return SimpleNamespace(tokens=self.results.pop(0) if self.results else [])
+
+    def is_silence(self, result, no_speech_threshold: float) -> bool:
+        return not result.tokens
+
+    def decode(self, mel: Tensor, no_speech_threshold=0.6, prompt=None, silence=None) -> str:
+        self.tails.append((mel.shape[-1], prompt))
+        return "tail"
+
+
+class Broadcast:
+    def __init__(self) -> None:
+        self.texts = []
+
+    def partial(self, text: str):
+        self.texts.append(text)
+
+
+def builder(model: Model, broadcast: Broadcast = None) -> StreamingFeatures:
+    config = StreamingConfig(window_sec=5.0, step_sec=1.0)
+    return StreamingFeatures(model, config, None, SR, SR, 80, broadcast)
+
+
+def feed(features: StreamingFeatures, seconds: float):
+    X = randn(int(SR * seconds), generator=Generator().manual_seed(0)) * 0.1
+    for i in range(0, X.shape[0], CHUNK):
+        features.feed(X[i : i + CHUNK])
+
+
+def test_streaming_decodes_only_while_attending():
+    model = Model([1, BEGIN + 50])
+    features = builder(model)
+    features.reset(attending=False)
+    assert features.worker is None
+    feed(features, 2.0)
+    features.finish()
+    assert model.prompts == [] and model.tiers["full"].partials == 0
+    features.reset()
+    feed(features, 2.0)
+    for _ in range(100):
+        if model.tiers["full"].partials:
+            break
+        sleep(0.01)
+    features.finish()
+    assert features.worker is None
+    assert model.prompts[0] == [7]
+    assert model.tiers["full"].stats["partials"] == len(model.prompts)
+
+
+def test_streaming_tentative_before_window():
+    broadcast = Broadcast()
+    model = Model([1, BEGIN + 50, 2])
+    features = builder(model, broadcast)
+    features.reset(attending=False)
+    feed(features, 3.0)
+    features.step()
+    # window isn't long enough to commit
+    assert features.committed == 0 and features.texts == []
+    assert broadcast.texts == ["w1 w2"]
+
+
+def test_streaming_commits_stable_segments():
+    """All complete segments are committed when the last one is followed by more text,
+    later windows are conditioned on them and complete only decodes the rest."""
+    broadcast = Broadcast()
+    model = Model([1, 2, BEGIN + 100, 3, BEGIN + 200, 4], [5, BEGIN + 50])
+    features = builder(model, broadcast)
+    features.reset(attending=False)
+    feed(features, 6.0)
+    features.step()
+    assert features.committed == 400 and features.texts == ["w1 w2", "w3"]
+    assert broadcast.texts == ["w1 w2 w3 w4"]
+    feed(features, 5.0)
+    features.step()
+    assert model.prompts[1] == [7, 1, 2, 3]
+    # the last segment may still change
+    assert features.committed == 400 and broadcast.texts[-1] == "w1 w2 w3 w5"
+    mel = features.finish()
+    assert features.complete(mel) == "w1 w2 w3 tail"
+    assert model.tails == [(mel.shape[-1] - 400, [1, 2, 3])]
+
+
+def test_streaming_keeps_last_segment():
+    model = Model([1, BEGIN + 100, 2, BEGIN + 200])
+    features = builder(model)
+    features.reset(attending=False)
+    feed(features, 6.0)
+    features.step()
+    assert features.committed == 200 and features.tokens == [1]
+
+
+def test_streaming_stop():
+    """Dropped captures stop the worker, a silent window broadcasts nothing."""
+    broadcast = Broadcast()
+    features = builder(Model(), broadcast)
+    worker = features.worker
+    features.stop()
+    assert features.worker is None and not worker.is_alive()
+    feed(features, 2.0)
+    features.step()
+    assert broadcast.texts == []
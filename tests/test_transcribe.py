@@ -0,0 +1,99 @@
+from whisper.model import Whisper, ModelDimensions
+from whisper.audio import log_mel_spectrogram, N_FRAMES, N_SAMPLES
+from torch import Generator, manual_seed, no_grad, randn
+import whisper
+
+from app.audio import parallel, transcribe
+from app.system.config import Config, DecodingProfile
+
+SR = 16000
+
+
+def tiny_model(n_mels: int = 80) -> Whisper:
+    """Random weights, the decoder is noisy enough to emit text and timestamps."""
+    manual_seed(0)
+    dims = ModelDimensions(n_mels, 1500, 64, 2, 1, 51864, 448, 64, 2, 1)
+    model = Whisper(dims).eval()
+    with no_grad():
+        for parameter in model.decoder.parameters():
+            parameter.normal_(0, 0.5)
+    return model
+
+
+def load(monkeypatch, screening: bool = False) -> transcribe.Transcribe:
+    """Transcribe with tiny models, the screen model has 128 mel bins like large-v3."""
+    config = Config.from_toml("config.toml").models.transcribe
+    config.screening.enabled = screening
+    monkeypatch.setattr(
+        transcribe,
+        "load_model",
+        lambda name: tiny_model(128 if name == config.screening.model else 80),
+    )
+    config.profiles["greedy"] = DecodingProfile(temperatures=(0.0,), sample_len=64)
+    config.profile = "greedy"
+    model = transcribe.Transcribe(config, SR)
+    model.executor.submit(int).result()
+    return model
+
+
+def test_decode_matches_whisper_transcribe(monkeypatch):
+    """Same windows, seeking and text as whisper's transcribe over a 70 s capture.
+    Installed whisper pads the last window with zeros instead of the silence level."""
+    model = load(monkeypatch)
+    X = randn(SR * 70, generator=Generator().manual_seed(0)) * 0.1
+    mel = log_mel_spectrogram(X, 80, padding=N_SAMPLES)[:, :-N_FRAMES]
+    expected = whisper.transcribe(
+        model.model,
+        X,
+        temperature=(0.0,),
+        sample_len=64,
+        initial_prompt=model.config.initial_prompt,
+        language="en",
+        fp16=False,
+    )
+    # seeks to the last timestamp, not every 30 s
+    assert any(segment["seek"] % N_FRAMES for segment in expected["segments"])
+    assert model.decode(mel, silence=0.0) == expected["text"].strip()
+    model.close()
+
+
+def test_tiers_get_their_own_mel_bins(monkeypatch):
+    model = load(monkeypatch, screening=True)
+    model.warmup()
+    X = randn(SR * 2, generator=Generator().manual_seed(0)) * 0.1
+    model.predict(X, tier="screen")
+    model.predict(X)
+    assert [tier["calls"] for tier in model.stats] == [1, 1]
+    model.close()
+
+
+def test_decode_after_evict(monkeypatch):
+    """The full model reloads on decode, the screen tier only lasts while it is evicted."""
+    model = load(monkeypatch)
+    mel = model.log_mel(randn(SR * 2, generator=Generator().manual_seed(0)) * 0.1)
+    model.last_used -= model.idle_sec
+    model.evict()
+    assert model.model is None and model.screening
+    model.decode(mel)
+    assert model.reloads == 1 and not model.screening
+    model.close()
+
+
+def test_evict_skips_recently_used(monkeypatch):
+    """The timer can fire just before a transcription touches the model."""
+    model = load(monkeypatch)
+    model.last_used -= model.idle_sec
+    model.touch()
+    model.evict()
+    assert model.model is not None and model.evictions == 0
+    model.close()
+
+
+def test_parallel_workers_never_evict(monkeypatch):
+    model = load(monkeypatch)
+    model.config.eviction.enabled = True
+    parallel._init(model.config, SR, 1)
+    assert parallel._transcribe.idle is None
+    assert not parallel._transcribe.config.eviction.enabled
+    parallel._transcribe.close()
+    model.close()
@@ -0,0 +1,44 @@
+from torch import Generator, arange, randn, sin, zeros
+from math import pi
+
+from app.audio.vad import VAD
+from app.system.config import VADConfig
+
+SR, CHUNK = 24000, 2048
+t = arange(CHUNK) / SR
+
+
+def vad() -> VAD:
+    return VAD(VADConfig(), SR, CHUNK)
+
+
+def test_vad_frames():
+    detector = vad()
+    assert detector.n_frames == 4 and detector.frame * 4 == CHUNK
+
+
+def test_vad_voiced_speech_and_tone():
+    """Harmonics of a 150 Hz voice and a low tone are loud, tonal and cross zero slowly."""
+    speech = sum(0.1 / k * sin(2 * pi * 150 * k * t) for k in range(1, 8))
+    assert vad()(speech).all()
+    assert vad()(0.1 * sin(2 * pi * 220 * t)).all()
+
+
+def test_vad_rejects_noise_and_clicks():
+    # white noise is flat and crosses zero half the time
+    assert not vad()(randn(CHUNK, generator=Generator().manual_seed(0)) * 0.1).any()
+    # a high tone crosses zero too often
+    assert not vad()(0.1 * sin(2 * pi * 6000 * t)).any()
+    # impulses have a flat spectrum
+    clicks = zeros(CHUNK)
+    clicks[::256] = 0.5
+    assert not vad()(clicks).any()
+
+
+def test_vad_energy_threshold_moves():
+    tone = 0.001 * sin(2 * pi * 220 * t)
+    detector = vad()
+    assert not detector(tone).any()
+    # e.g. a lower noise floor
+    detector.energy_db = -70
+    assert detector(tone).all()